@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Minimal daemon client for claude-code-status-line.py
+
+Forwards the stdin JSON to a warm `--serve` daemon and prints its reply.
+Python compiles a script run as __main__ on every start and never caches
+its bytecode, so this entry point is kept tiny; the renderer stays in
+claude-code-status-line.py, which must sit next to this file.
+
+When no daemon answers, one is started in the background and this refresh
+is rendered by the main script, so the status line never goes blank.
+
+INSTALLATION (see "Daemon Mode" in the README):
+   {
+     "statusLine": {
+       "type": "command",
+       "command": "~/.claude/claude-code-status-line-client.py"
+     }
+   }
+
+Latest version: https://github.com/benabraham/claude-code-status-line
+"""
+
+import os
+import socket
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "claude-code-status-line.py")
+CACHE_DIR = os.path.expanduser(os.environ.get("SL_CACHE_DIR", "~/.claude"))
+THEME_FILE = os.environ.get("SL_THEME_FILE", os.path.expanduser("~/.claude/claude-code-theme.toml"))
+PLUGIN_DIRS = (os.path.join(".claude", "statusline"), os.path.expanduser("~/.claude/statusline"))
+CLIENT_TIMEOUT = 5  # seconds; give up on the daemon and render with the main script
+
+
+def config_signature():
+    """Everything that changes what a render prints: environment, script, theme, plugins."""
+    sig = [sys.executable, os.environ.get("HOME", ""), os.environ.get("COLORTERM", ""), os.environ.get("COLUMNS", "")]
+    sig.extend(sorted((k, v) for k, v in os.environ.items() if k.startswith("SL_")))
+    for path in (SCRIPT, THEME_FILE):
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((path, None))
+    for plugin_dir in PLUGIN_DIRS:
+        try:
+            names = sorted(os.listdir(plugin_dir))
+        except OSError:
+            continue
+        for name in names:
+            if name.endswith(".py"):
+                filepath = os.path.abspath(os.path.join(plugin_dir, name))
+                try:
+                    sig.append((filepath, os.stat(filepath).st_mtime_ns))
+                except OSError:
+                    pass
+    return sig
+
+
+def socket_path():
+    """Socket of the daemon for the current configuration."""
+    import zlib
+
+    key = zlib.crc32(repr(config_signature()).encode())
+    return os.path.join(CACHE_DIR, f".statusline-client-{key:08x}.sock")
+
+
+def render_elsewhere(raw, path):
+    """Start a daemon on path for the next refresh and render this one with the main script."""
+    import subprocess
+
+    try:
+        subprocess.Popen(
+            [sys.executable, SCRIPT, "--serve", path],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        result = subprocess.run([sys.executable, SCRIPT], input=raw, capture_output=True, text=True)
+    except OSError as e:
+        print(f"statusline: {e}", file=sys.stderr)
+        return 1
+    sys.stdout.write(result.stdout)
+    sys.stderr.write(result.stderr)
+    return result.returncode
+
+
+def main():
+    raw = sys.stdin.read()
+    path = socket_path()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(path)
+            sock.sendall(raw.encode())
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return render_elsewhere(raw, path)
+    # Reply framing: stdout text, NUL, stderr text. Nothing at all means the
+    # daemon failed to render, so the main script does it instead.
+    out, sep, err = b"".join(chunks).partition(b"\0")
+    if not sep:
+        return render_elsewhere(raw, path)
+    sys.stdout.write(out.decode())
+    sys.stderr.write(err.decode())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,17 +23,11 @@ Note: After initial setup, edits to this script take effect immediately (no rest
 Latest version: https://github.com/benabraham/claude-code-status-line
 """
 
-import json
 import os
-import re
-import select
-import subprocess
 import sys
-import tempfile
-import termios
 import time
-import tty
-from datetime import datetime, timezone
+
+_MODULE_START = time.perf_counter()  # SL_PROFILE: module load time is measured from here
 
 VERSION = "5.6.0"
 
@@ -64,9 +58,165 @@ UPDATE_VERSION_CMD = _env_str("UPDATE_VERSION_CMD", "")  # Custom command to fet
 UPDATE_VERSION_SOURCE = _env_str("UPDATE_VERSION_SOURCE", "custom")  # Label for custom source
 STATUSLINE_CACHE_DURATION = _env_int("STATUSLINE_CACHE_DURATION", 86400)  # 24 hours
 SHOW_STATUSLINE_UPDATE = _env_str("SHOW_STATUSLINE_UPDATE", "1") == "1"
+STALE_MARKER = _env_str("STALE_MARKER", "")  # appended to segments served from an expired cache
 THEME_FILE = _env_str("THEME_FILE", os.path.expanduser("~/.claude/claude-code-theme.toml"))
 DUMP = _env_str("DUMP", "")
-DUMP_PATH = "/tmp/claude-statusline-dump.jsonl"
+DUMP_PATH = _env_str("DUMP_PATH", "/tmp/claude-statusline-dump.jsonl")
+DUMP_MAX_BYTES = _env_int("DUMP_MAX_BYTES", 10 * 1024 * 1024)  # rotate the dump past this size (0 = never)
+DUMP_MAX_AGE = _env_int("DUMP_MAX_AGE", 86400)  # ...or once its first record is this old, seconds (0 = never)
+DUMP_KEEP = _env_int("DUMP_KEEP", 5)  # rotated dumps kept next to DUMP_PATH
+DUMP_SAMPLE = max(1, _env_int("DUMP_SAMPLE", 1))  # dump 1 in N renders
+DUMP_GZIP = _env_str("DUMP_GZIP", "0") == "1"  # compress rotated dumps (background gzip)
+DUMP_DEDUPE = _env_str("DUMP_DEDUPE", "0") == "1"  # skip a payload identical to the session's previous one
+PROFILE = _env_str("PROFILE", "")  # "1" for stderr, or a file path; one JSONL timing record per render
+_PROFILE_ENABLED = bool(PROFILE)  # also switched on by the --bench worker, which collects without emitting
+CACHE_DIR = os.path.expanduser(_env_str("CACHE_DIR", "~/.claude"))  # status line caches (not the theme, plugins or credentials)
+DAEMON_IDLE = _env_int("DAEMON_IDLE", 1800)  # --serve exits after 30 min without requests
+DAEMON_CLIENT_TIMEOUT = 5  # --client gives up on the daemon and renders in-process
+GATHER_DEADLINE = 5  # seconds; data providers still running after this render as empty
+BUDGET_MS = _env_int("BUDGET_MS", 0)  # total render budget; late providers fall back to their last value (0 = GATHER_DEADLINE)
+BUDGET_LOG = _env_str("BUDGET_LOG", "")  # JSONL log of budget degradations (default: CACHE_DIR/.budget.log)
+GIT_CACHE_TTL = _env_int("GIT_CACHE_TTL", 5)  # max age of a git result reused on an unchanged .git fingerprint
+RENDER_CACHE = _env_str("RENDER_CACHE", "1") == "1"  # reuse identical renders across invocations
+MINIFY_ANSI = _env_str("MINIFY_ANSI", "1") == "1"  # drop redundant color/bold escape codes from the output
+PLUGIN_TIMEOUT_MS = _env_int("PLUGIN_TIMEOUT_MS", 500)  # per plugin segment; late ones show their last good output
+PLUGIN_DEMOTE_AFTER = 3  # consecutive timeouts before a plugin segment stops being run
+PLUGIN_RETRY = 300  # seconds a demoted plugin segment waits before it is tried again
+USAGE_HISTORY = _env_str("USAGE_HISTORY", "1") == "1"  # record usage samples to CACHE_DIR/.usage_history.bin
+WIDTH = _env_int("WIDTH", 0)  # columns each line must fit in (0 = $COLUMNS when set, else unlimited)
+
+# Plugin directories, searched in order: project-level (cwd-relative), then global
+PLUGIN_DIRS = (os.path.join(".claude", "statusline"), os.path.expanduser("~/.claude/statusline"))
+
+
+# =============================================================================
+# DAEMON CLIENT (runs before the remaining imports, theme and plugin loading)
+# =============================================================================
+
+"""
+Opt-in daemon mode: `--serve` keeps the parsed theme, segments and plugins
+loaded behind a UNIX socket and renders each request in a forked copy of
+itself; `--client` forwards stdin to it and prints the reply. The client shim
+below runs before the remaining stdlib imports, theme and plugin loading,
+but Python still compiles this whole file on every start. The standalone
+claude-code-status-line-client.py skips that too; it names its own socket
+and passes it to `--serve`.
+
+Each distinct configuration gets its own daemon: the socket name is derived
+from everything baked in at import time (SL_* env, COLORTERM, this script,
+the theme file, plugin files). Editing any of them routes clients to a fresh
+daemon; the old one exits after SL_DAEMON_IDLE seconds without requests.
+"""
+
+_STDIN_RAW = None  # stdin already consumed by the --client shim, if any
+
+
+def _config_signature():
+    """Everything baked in at import time that changes what a render prints."""
+    sig = [VERSION, sys.executable, os.environ.get("HOME", ""), os.environ.get("COLORTERM", ""), os.environ.get("COLUMNS", "")]
+    sig.extend(sorted((k, v) for k, v in os.environ.items() if k.startswith("SL_")))
+    for path in (os.path.abspath(__file__), THEME_FILE):
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((path, None))
+    for plugin_dir in PLUGIN_DIRS:
+        try:
+            names = sorted(os.listdir(plugin_dir))
+        except OSError:
+            continue
+        for name in names:
+            if name.endswith(".py"):
+                filepath = os.path.abspath(os.path.join(plugin_dir, name))
+                try:
+                    sig.append((filepath, os.stat(filepath).st_mtime_ns))
+                except OSError:
+                    pass
+    return sig
+
+
+def _daemon_socket_path():
+    """Socket path for the current configuration."""
+    import zlib
+
+    key = zlib.crc32(repr(_config_signature()).encode())
+    return os.path.join(CACHE_DIR, f".statusline-{key:08x}.sock")
+
+
+def _spawn_daemon():
+    """Start a detached --serve process for the current configuration."""
+    import subprocess
+
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        pass
+
+
+def _daemon_client():
+    """Forward stdin to the daemon and print its reply. Returns True when served.
+
+    A missing or dead daemon is started in the background and this render
+    falls back to the in-process path; a slow one is simply not waited for.
+    """
+    import socket
+
+    global _STDIN_RAW
+    _STDIN_RAW = sys.stdin.read()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(DAEMON_CLIENT_TIMEOUT)
+            sock.connect(_daemon_socket_path())
+            sock.sendall(_STDIN_RAW.encode())
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except (FileNotFoundError, ConnectionRefusedError):
+        _spawn_daemon()
+        return False
+    except OSError:
+        return False
+    # Reply framing: stdout text, NUL, stderr text. Nothing at all means the
+    # daemon failed to render, so this process does it instead.
+    out, sep, err = b"".join(chunks).partition(b"\0")
+    if not sep:
+        return False
+    sys.stdout.write(out.decode())
+    sys.stderr.write(err.decode())
+    return True
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--client"]:
+    if _daemon_client():
+        sys.exit(0)
+
+
+# Everything below is only needed to render in-process; a served --client
+# exits above without paying for these imports.
+import fcntl  # noqa: E402
+import functools  # noqa: E402
+import json  # noqa: E402
+import re  # noqa: E402
+import select  # noqa: E402
+import shutil  # noqa: E402
+import struct  # noqa: E402
+import subprocess  # noqa: E402
+import tempfile  # noqa: E402
+import termios  # noqa: E402
+import threading  # noqa: E402
+import tty  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
 
 
 def _parse_usage_deadline(raw):
@@ -108,6 +258,33 @@ SEGMENT_DEFAULTS = {
     "usage_burndown": {"coeff": "1.4"},
 }
 
+# Layout priority when a line is wider than SL_WIDTH: lowest is shortened,
+# then dropped, first. Override per segment with priority=N; plugins default to 50.
+SEGMENT_PRIORITY = {
+    "model": 100,
+    "progress_bar": 95,
+    "percentage": 90,
+    "usage_5hour": 80,
+    "usage_weekly": 75,
+    "directory": 70,
+    "git_branch": 60,
+    "git_status": 55,
+    "tokens": 50,
+    "usage_fable": 45,
+    "usage_burndown": 35,
+    "worktree": 30,
+    "added_dirs": 20,
+    "update": 10,
+}
+
+# Options that render a narrower form of a segment, tried before dropping it
+SEGMENT_COMPACT = {
+    "directory": {"basename_only": "1"},
+    "added_dirs": {"basename_only": "1"},
+    "model": {"effort": "short"},
+    "worktree": {"show": "name"},
+}
+
 
 def _parse_segments(raw):
     """Parse 'segment:key=val:key=val ...' into [(name, {opts}), ...]"""
@@ -145,22 +322,146 @@ def _parse_segments(raw):
 SEGMENTS = _parse_segments(os.environ.get("SL_SEGMENTS"))
 
 
+def _dump_rotate(first_line, size):
+    """Move the live dump aside if it is too big or too old; prune old rotations.
+
+    Returns True when the dump was rotated away.
+    """
+    too_big = DUMP_MAX_BYTES and size >= DUMP_MAX_BYTES
+    too_old = False
+    if DUMP_MAX_AGE and first_line:
+        try:
+            started = datetime.fromisoformat(json.loads(first_line)["timestamp"])
+            too_old = (datetime.now(timezone.utc) - started).total_seconds() >= DUMP_MAX_AGE
+        except (ValueError, KeyError, TypeError):
+            pass
+    if not (too_big or too_old):
+        return False
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    rotated = f"{DUMP_PATH}.{stamp}-{os.getpid()}"
+    try:
+        os.rename(DUMP_PATH, rotated)
+    except OSError:
+        return False  # Another render rotated it first
+    if DUMP_GZIP:
+        try:
+            subprocess.Popen(
+                ["gzip", "-q", rotated],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except OSError:
+            pass  # No gzip: keep it uncompressed
+    directory, base = os.path.split(DUMP_PATH)
+    try:
+        old = sorted(n for n in os.listdir(directory or ".") if n.startswith(base + ".") and n[len(base) + 1 : len(base) + 2].isdigit())
+    except OSError:
+        return True
+    for name in old[: max(0, len(old) - DUMP_KEEP)]:
+        try:
+            os.unlink(os.path.join(directory, name))
+        except OSError:
+            pass
+    return True
+
+
+DUMP_DEDUPE_TAIL = 65536  # bytes at the end of the dump searched for the session's previous payload
+
+
+def _dump_is_repeat(data):
+    """Whether data equals the previous dumped payload of its session (SL_DUMP_DEDUPE).
+
+    Compared against the dump's own tail, so dedupe costs one read and no
+    write. A session whose last record is further back is dumped again.
+    """
+    try:
+        with open(DUMP_PATH, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - DUMP_DEDUPE_TAIL))
+            lines = f.read().splitlines()
+    except OSError:
+        return False
+    if size > DUMP_DEDUPE_TAIL:
+        lines = lines[1:]  # Cut mid-record
+    session = data.get("session_id")
+    for line in reversed(lines):
+        try:
+            previous = json.loads(line).get("input")
+        except (ValueError, AttributeError):
+            continue
+        if isinstance(previous, dict) and previous.get("session_id") == session:
+            return previous == data
+    return False
+
+
 def _dump_input(data):
     if not DUMP:
         return
+    if DUMP_SAMPLE > 1 and int.from_bytes(os.urandom(4), "little") % DUMP_SAMPLE:
+        return
     try:
+        if DUMP_DEDUPE and _dump_is_repeat(data):
+            return
         entry = json.dumps(
             {
                 "timestamp": datetime.now(timezone.utc).isoformat(),
                 "input": data,
             }
         )
-        with open(DUMP_PATH, "a") as f:
+        # a+ lets rotation read the first record's age without a second open
+        with open(DUMP_PATH, "a+") as f:
+            size = f.tell()
+            first_line = ""
+            if size and DUMP_MAX_AGE:
+                f.seek(0)
+                first_line = f.readline()
+            if not (size and _dump_rotate(first_line, size)):
+                f.write(entry + "\n")
+                return
+        with open(DUMP_PATH, "a") as f:  # fresh file after rotation
             f.write(entry + "\n")
     except Exception:
         pass
 
 
+# --- SL_PROFILE instrumentation ---
+_PROFILE_LOAD = {"plugins_ms": {}}  # one-off load timings (theme, plugins, startup)
+_PROFILE_RENDER = {}  # timings of the current render; reset per render
+
+
+def _ms_since(start):
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def _process_age_ms():
+    """Milliseconds since this process was started (Linux /proc, ~10 ms resolution), or None."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        start = int(fields[19]) / os.sysconf("SC_CLK_TCK")  # field 22: starttime in clock ticks
+        return round((uptime - start) * 1000, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _emit_profile():
+    """Write the current render's timings as one JSONL record to SL_PROFILE."""
+    record = {"ts": round(time.time(), 3), "pid": os.getpid(), **_PROFILE_LOAD, **_PROFILE_RENDER}
+    line = json.dumps(record) + "\n"
+    if PROFILE in ("1", "stderr"):
+        sys.stderr.write(line)
+        return
+    try:
+        with open(os.path.expanduser(PROFILE), "a") as f:
+            f.write(line)
+    except OSError:
+        pass
+
+
 def _has_segment(name):
     return any(n == name for n, _ in SEGMENTS)
 
@@ -191,6 +492,7 @@ def hex_to_rgb(hex_color):
 _CUBE_VALS = (0, 95, 135, 175, 215, 255)
 
 
+@functools.lru_cache(maxsize=None)
 def hex_to_256(hex_color):
     """Convert '#RRGGBB' hex to nearest xterm-256 color index."""
     rgb = hex_to_rgb(hex_color)
@@ -403,7 +705,17 @@ def _load_custom_theme():
     THEME = "custom"
 
 
-_load_custom_theme()
+_THEME_LOADED = False
+
+
+def _theme():
+    """Active theme dict; SL_THEME_FILE is parsed on first use, not at startup."""
+    global _THEME_LOADED
+    if not _THEME_LOADED:
+        _THEME_LOADED = True
+        _load_custom_theme()
+    return THEMES[THEME]
+
 
 # =============================================================================
 # COLOR SUPPORT DETECTION
@@ -460,9 +772,17 @@ def fg_gradient(rgb, fallback_256):
 
 def fg_empty():
     """Foreground for empty bar portion"""
-    theme = THEMES[THEME]
-    rgb, fallback = theme["bar_empty"]
-    return _color(rgb, fallback, is_bg=False)
+    return PALETTE["fg"]["bar_empty"]
+
+
+def _fg(key):
+    """Compiled foreground escape for a simple theme color ('bar_empty', 'usage_*')."""
+    return PALETTE["fg"][key]
+
+
+def _bg(key):
+    """Compiled background escape for a simple theme color ('bar_empty', 'usage_*')."""
+    return PALETTE["bg"][key]
 
 
 # =============================================================================
@@ -472,16 +792,22 @@ def fg_empty():
 
 def get_colors_for_percentage(pct):
     """Return (rgb, fallback_256) for progress bar fill at given percentage"""
-    theme = THEMES[THEME]
+    theme = _theme()
     for threshold, color in theme["gradient"]:
         if pct < threshold:
             return color
     return theme["gradient"][-1][1]
 
 
+def fill_color(pct):
+    """Foreground escape for the progress bar fill at pct (compiled for 0-100)."""
+    if 0 <= pct <= 100:
+        return PALETTE["fill"][int(pct)]  # gradient thresholds are integers
+    return fg_gradient(*get_colors_for_percentage(pct))
+
+
 def get_model_colors(model):
     """Return (bg_code, fg_code) for model badge"""
-    theme = THEMES[THEME]
     if "Sonnet" in model:
         key = "model_sonnet"
     elif "Opus" in model:
@@ -492,18 +818,15 @@ def get_model_colors(model):
         key = "model_fable"
     else:
         key = "model_default"
-
-    bg_tuple, fg_tuple = theme[key]
-    bg_code = _color(bg_tuple[0], bg_tuple[1], is_bg=True)
-    fg_code = _color(fg_tuple[0], fg_tuple[1], is_bg=False)
-    return bg_code + BOLD + fg_code
+    return PALETTE["model"][key]
 
 
 def text_color(key):
     """Get text color by key: 'percent', 'numbers', 'cwd', 'git', 'effort'"""
-    theme = THEMES[THEME]
-    color_tuple = theme[f"text_{key}"]
-    return fg_themed(color_tuple)
+    escape = PALETTE["text"].get(key)
+    if escape is None:
+        escape = fg_themed(_theme()[f"text_{key}"])  # KeyError for unknown keys, as before
+    return escape
 
 
 def get_effort_level(data):
@@ -521,6 +844,134 @@ def get_effort_level(data):
 # =============================================================================
 
 
+def _read_json(path):
+    """Parsed JSON object from path, or None if missing, unreadable or not an object."""
+    try:
+        with open(path) as f:
+            obj = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _write_json_atomic(path, obj):
+    """Write obj as JSON via temp file + rename, so concurrent readers never see a partial file."""
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        if tmp_path:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+# =============================================================================
+# COMPILED PALETTE
+# =============================================================================
+
+"""
+The active theme compiled into finished escape strings: bar fill per
+percentage (0-100), fg/bg for the simple colors, text keys and model badges.
+It is cached in CACHE_DIR/.theme_cache.json keyed on SL_THEME, THEME_FILE,
+COLORTERM and this script, so a normal start skips the TOML parse and every
+hex_to_256() search. The raw theme dict stays available through _theme().
+"""
+
+PALETTE_CACHE_PATH = os.path.join(CACHE_DIR, ".theme_cache.json")
+SIMPLE_THEME_COLORS = ("bar_empty", "usage_light", "usage_green", "usage_yellow", "usage_red")
+
+
+def _palette_signature():
+    sig = [VERSION, _env_str("THEME", "dark"), TRUECOLOR]
+    for path in (os.path.abspath(__file__), THEME_FILE):
+        try:
+            st = os.stat(path)
+            sig.append([path, st.st_mtime_ns, st.st_size])
+        except OSError:
+            sig.append([path, None])
+    return sig
+
+
+def _compile_palette():
+    theme = _theme()
+    models = {}
+    for key, value in theme.items():
+        if key.startswith("model_"):
+            (bg_rgb, bg_fb), (fg_rgb, fg_fb) = value
+            models[key] = _color(bg_rgb, bg_fb, is_bg=True) + BOLD + _color(fg_rgb, fg_fb, is_bg=False)
+    return {
+        "fill": [fg_gradient(*get_colors_for_percentage(pct)) for pct in range(101)],
+        "fg": {key: _color(*theme[key], is_bg=False) for key in SIMPLE_THEME_COLORS},
+        "bg": {key: _color(*theme[key], is_bg=True) for key in SIMPLE_THEME_COLORS},
+        "text": {key[len("text_") :]: fg_themed(value) for key, value in theme.items() if key.startswith("text_")},
+        "model": models,
+    }
+
+
+def _load_palette():
+    """Compiled palette from cache, or compiled now; None when THEME is not a known theme."""
+    sig = _palette_signature()
+    cached = _read_json(PALETTE_CACHE_PATH)
+    if cached and cached.get("key") == sig and isinstance(cached.get("palette"), dict):
+        return cached["palette"]
+    try:
+        _theme()
+    except KeyError:
+        return None
+    palette = _compile_palette()
+    _write_json_atomic(PALETTE_CACHE_PATH, {"key": sig, "palette": palette})
+    return palette
+
+
+_theme_start = time.perf_counter()
+PALETTE = _load_palette()
+_PROFILE_LOAD["theme_ms"] = _ms_since(_theme_start)
+
+
+def _parse_payload_line(line):
+    """One NDJSON line as a status payload, or None if it is not one.
+
+    Accepts raw stdin payloads and SL_DUMP records ({"timestamp", "input"}).
+    """
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(obj, dict) and isinstance(obj.get("input"), dict) and "timestamp" in obj:
+        obj = obj["input"]
+    return obj if isinstance(obj, dict) else None
+
+
+def _iter_payload_lines(path):
+    """Every line of an NDJSON file ("-" for stdin, .gz rotated dumps too), blank ones included, read lazily."""
+    if path == "-":
+        f = sys.stdin
+    elif path.endswith(".gz"):
+        import gzip
+
+        f = gzip.open(path, "rt")
+    else:
+        f = open(path)
+    try:
+        yield from f
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _iter_payloads(path):
+    """Status payloads from an NDJSON file ("-" for stdin); unparsable lines are skipped."""
+    for line in _iter_payload_lines(path):
+        payload = _parse_payload_line(line)
+        if payload is not None:
+            yield payload
+
+
 def center_text(text, min_width=12):
     """Center text with 1-char padding on each side, minimum 12 chars wide"""
     width = max(min_width, len(text) + 2)
@@ -529,8 +980,90 @@ def center_text(text, min_width=12):
     return " " * padding + text + " " * right_padding
 
 
-def get_git_branch(cwd):
-    """Get current git branch, or None"""
+# One porcelain v2 probe per cwd and render, shared by git_branch and git_status
+_GIT_PROBES = {}
+
+
+def _parse_git_porcelain_v2(output):
+    """Parse `git status --porcelain=v2 --branch --show-stash` into {branch, status, upstream}."""
+    branch = upstream = None
+    staged = modified = deleted = renamed = untracked = conflicted = 0
+    stashed = ahead = behind = 0
+    for line in output.splitlines():
+        if line.startswith("# "):
+            key, _, value = line[2:].partition(" ")
+            if key == "branch.head":
+                branch = None if value == "(detached)" else value
+            elif key == "branch.upstream":
+                upstream = value
+            elif key == "branch.ab":
+                parts = value.split()
+                if len(parts) == 2:
+                    ahead, behind = int(parts[0]), -int(parts[1])
+            elif key == "stash":
+                stashed = int(value)
+        elif line.startswith(("1 ", "2 ")) and len(line) > 3:
+            # Ordinary or renamed/copied entry; "." marks an unmodified side
+            x, y = line[2], line[3]
+            # Index (staged) changes
+            if x in "MARC":
+                staged += 1
+            if x == "R":
+                renamed += 1
+            if x == "D":
+                deleted += 1
+            # Worktree changes
+            if y == "M":
+                modified += 1
+            if y == "D":
+                deleted += 1
+        elif line.startswith("u "):
+            conflicted += 1
+        elif line.startswith("? "):
+            untracked += 1
+    return {
+        "branch": branch,
+        "upstream": upstream,
+        "status": {
+            "staged": staged,
+            "modified": modified,
+            "deleted": deleted,
+            "renamed": renamed,
+            "untracked": untracked,
+            "stashed": stashed,
+            "ahead": ahead,
+            "behind": behind,
+            "conflicted": conflicted,
+        },
+    }
+
+
+def _git_probe(cwd):
+    """Branch, upstream, ahead/behind, stash count and file states from one git call.
+
+    Replaces the separate status, stash list, rev-list and branch invocations.
+    Memoized per render in _GIT_PROBES. Returns None outside a repository.
+    """
+    if cwd in _GIT_PROBES:
+        return _GIT_PROBES[cwd]
+    probe = None
+    try:
+        result = subprocess.run(
+            ["git", "-C", cwd, "status", "--porcelain=v2", "--branch", "--show-stash"],
+            capture_output=True,
+            text=True,
+            timeout=0.5,  # one call now covers what used to be four 0.3 s calls
+        )
+        if result.returncode == 0:
+            probe = _parse_git_porcelain_v2(result.stdout)
+    except Exception:
+        pass
+    _GIT_PROBES[cwd] = probe
+    return probe
+
+
+def _git_branch_command(cwd):
+    """Current branch via `git branch --show-current`, or None"""
     try:
         result = subprocess.run(
             ["git", "-C", cwd, "-c", "color.branch=never", "branch", "--show-current"],
@@ -549,113 +1082,312 @@ def get_git_branch(cwd):
     return None
 
 
-def get_git_status(cwd):
-    """Get git status indicators (staged, modified, etc.)"""
-    try:
-        # Get porcelain status for working directory state
-        result = subprocess.run(
-            ["git", "-C", cwd, "status", "--porcelain=v1"],
-            capture_output=True,
-            text=True,
-            timeout=0.3,
-        )
-        if result.returncode != 0:
-            return None
+# --- Git state cache ---
+# Results are reused while a cheap fingerprint of the repository metadata is
+# unchanged. Edits to tracked files below the top level do not touch anything
+# fingerprinted, so a hit is only trusted for SL_GIT_CACHE_TTL seconds.
 
-        staged = modified = deleted = renamed = untracked = conflicted = 0
-        for line in result.stdout.splitlines():
-            if len(line) < 2:
-                continue
-            x, y = line[0], line[1]
-            # Conflict states
-            if x == "U" or y == "U" or (x == "A" and y == "A") or (x == "D" and y == "D"):
-                conflicted += 1
-            else:
-                # Index (staged) changes
-                if x in "MARC":
-                    staged += 1
-                if x == "R":
-                    renamed += 1
-                if x == "D":
-                    deleted += 1
-                # Worktree changes
-                if y == "M":
-                    modified += 1
-                if y == "D":
-                    deleted += 1
-                if y == "?":
-                    untracked += 1
-
-        # Check stash
-        stashed = 0
-        stash_result = subprocess.run(
-            ["git", "-C", cwd, "stash", "list"],
-            capture_output=True,
-            text=True,
-            timeout=0.3,
-        )
-        if stash_result.returncode == 0:
-            stashed = len(stash_result.stdout.strip().splitlines()) if stash_result.stdout.strip() else 0
+GIT_CACHE_PATH = os.path.join(CACHE_DIR, ".git_cache.json")
+GIT_CACHE_MAX_ENTRIES = 32
+_GIT_CACHE = None  # "kind:worktree_root" -> {time, fp, value}; loaded lazily
+_GIT_LOCK = threading.Lock()
 
-        # Check ahead/behind
-        ahead = behind = 0
-        ab_result = subprocess.run(
-            ["git", "-C", cwd, "rev-list", "--left-right", "--count", "@{upstream}...HEAD"],
-            capture_output=True,
-            text=True,
-            timeout=0.3,
-        )
-        if ab_result.returncode == 0:
-            parts = ab_result.stdout.strip().split()
-            if len(parts) == 2:
-                behind, ahead = int(parts[0]), int(parts[1])
 
-        return {
-            "staged": staged,
-            "modified": modified,
-            "deleted": deleted,
-            "renamed": renamed,
-            "untracked": untracked,
-            "stashed": stashed,
-            "ahead": ahead,
-            "behind": behind,
-            "conflicted": conflicted,
-        }
-    except Exception:
+def _find_git_dirs(cwd):
+    """Locate (worktree_root, git_dir, common_dir) for cwd without running git.
+
+    Follows `gitdir:` files (linked worktrees, submodules) and `commondir`
+    (where a linked worktree keeps refs and stash). Returns None when no
+    repository is found or the layout is not understood.
+    """
+    if not cwd or os.environ.get("GIT_DIR"):
+        return None
+    path = os.path.abspath(cwd)
+    while True:
+        dotgit = os.path.join(path, ".git")
+        if os.path.isdir(dotgit):
+            git_dir = dotgit
+            break
+        if os.path.isfile(dotgit):
+            try:
+                with open(dotgit) as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if not line.startswith("gitdir:"):
+                return None
+            git_dir = os.path.normpath(os.path.join(path, line[len("gitdir:") :].strip()))
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, "commondir")) as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        pass
+    if not os.path.isfile(os.path.join(git_dir, "HEAD")):
         return None
+    return path, git_dir, common_dir
 
 
-# =============================================================================
-# USAGE LIMITS API
-# =============================================================================
+def _git_fingerprint(dirs, branch=None, upstream=None):
+    """mtime/size of the files git state depends on, plus top-level directory mtimes."""
+    root, git_dir, common_dir = dirs
+    paths = [
+        os.path.join(git_dir, "index"),
+        os.path.join(git_dir, "HEAD"),
+        os.path.join(common_dir, "refs", "stash"),
+        os.path.join(common_dir, "packed-refs"),
+    ]
+    if branch:
+        paths.append(os.path.join(common_dir, "refs", "heads", branch))
+    if upstream:
+        # branch.upstream is a short name: a remote-tracking or a local branch
+        paths.append(os.path.join(common_dir, "refs", "remotes", upstream))
+        paths.append(os.path.join(common_dir, "refs", "heads", upstream))
+    fp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            fp.append([st.st_mtime_ns, st.st_size])
+        except OSError:
+            fp.append(None)
+    # Files created or removed at the top level, or directly inside a top-level directory
+    try:
+        fp.append(os.stat(root).st_mtime_ns)
+        with os.scandir(root) as entries:
+            dirs_mtimes = sorted(
+                [e.name, e.stat(follow_symlinks=False).st_mtime_ns]
+                for e in entries
+                if e.name != ".git" and e.is_dir(follow_symlinks=False)
+            )
+    except OSError:
+        return None
+    fp.extend(dirs_mtimes)
+    return fp
 
-USAGE_CACHE_PATH = os.path.expanduser("~/.claude/.usage_cache.json")
-UPDATE_CACHE_PATH = os.path.expanduser("~/.claude/.update_cache.json")
-STATUSLINE_CACHE_PATH = os.path.expanduser("~/.claude/.statusline_cache.json")
-CREDENTIALS_PATH = os.path.expanduser("~/.claude/.credentials.json")
 
+def _git_cache():
+    """In-memory git cache, seeded from GIT_CACHE_PATH on first use."""
+    global _GIT_CACHE
+    if _GIT_CACHE is None:
+        try:
+            with open(GIT_CACHE_PATH) as f:
+                _GIT_CACHE = json.load(f)
+            if not isinstance(_GIT_CACHE, dict):
+                _GIT_CACHE = {}
+        except (OSError, ValueError):
+            _GIT_CACHE = {}
+    return _GIT_CACHE
 
-def _normalize_usage_data(rate_limits):
-    """Convert rate_limits from CC stdin JSON to internal usage format.
 
-    CC 2.1.80+ sends: {used_percentage: float, resets_at: unix_timestamp}
-    Internal format:  {utilization: int, resets_at: ISO8601_string}
+def _cached_git(cwd, kind, compute):
+    """compute(cwd), reused while the repository fingerprint is unchanged.
+
+    kind names the result ("probe" or "branch"); the branch and upstream it
+    reports pick which ref files are fingerprinted. Failed computations
+    (None) are not cached, so they are retried on the next render.
     """
-    if not rate_limits:
+    with _GIT_LOCK:  # branch and status providers run concurrently
+        dirs = _find_git_dirs(cwd)
+        if dirs is None:
+            return compute(cwd)
+        key = f"{kind}:{dirs[0]}"
+        cache = _git_cache()
+        entry = cache.get(key)
+        now = time.time()
+        if isinstance(entry, dict) and 0 <= now - entry.get("time", 0) < GIT_CACHE_TTL:
+            refs = entry.get("refs") or [None, None]
+            fp = _git_fingerprint(dirs, *refs)
+            if fp is not None and fp == entry.get("fp"):
+                return entry.get("value")
+
+        value = compute(cwd)
+        if value is None:
+            return None
+        if kind == "probe":
+            refs = [value.get("branch"), value.get("upstream")]
+        else:
+            refs = [value, None]
+        fp = _git_fingerprint(dirs, *refs)
+        if fp is None:
+            return value
+        cache[key] = {"time": now, "refs": refs, "fp": fp, "value": value}
+        if len(cache) > GIT_CACHE_MAX_ENTRIES:
+            for stale in sorted(cache, key=lambda k: cache[k].get("time", 0))[: len(cache) - GIT_CACHE_MAX_ENTRIES]:
+                del cache[stale]
+        _write_json_atomic(GIT_CACHE_PATH, cache)
+        return value
+
+
+# --- Pure-Python metadata reader ---
+# Branch, stash count and upstream straight from .git, without spawning git.
+
+
+def _git_config_upstream(common_dir, branch):
+    """Upstream short name ('origin/main', or 'main' for a local upstream) from
+    branch.<name>.remote and branch.<name>.merge in the repository config."""
+    remote = merge = None
+    section = None
+    try:
+        with open(os.path.join(common_dir, "config")) as f:
+            lines = f.readlines()
+    except OSError:
         return None
-    result = {}
-    for key in ("five_hour", "seven_day"):
-        window = rate_limits.get(key)
-        if not window:
+    for raw in lines:
+        line = raw.strip()
+        if not line or line[0] in "#;":
             continue
-        used_pct = window.get("used_percentage")
-        resets_at = window.get("resets_at")
-        if used_pct is None or resets_at is None:
+        if line.startswith("["):
+            m = re.match(r'\[\s*([A-Za-z0-9.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]', line)
+            section = (m.group(1).lower(), m.group(2)) if m else None
             continue
-        reset_dt = datetime.fromtimestamp(resets_at, tz=timezone.utc)
-        result[key] = {
-            "utilization": used_pct,
-            "resets_at": reset_dt.isoformat(),
+        if section != ("branch", branch) or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        value = re.split(r"\s[#;]", value.strip())[0].strip().strip('"')
+        key = key.strip().lower()
+        if key == "remote":
+            remote = value
+        elif key == "merge":
+            merge = value
+    if not remote or not merge or not merge.startswith("refs/heads/"):
+        return None
+    name = merge[len("refs/heads/") :]
+    return name if remote == "." else f"{remote}/{name}"
+
+
+def _read_git_metadata(cwd):
+    """Repository facts read from disk: {root, git_dir, common_dir, branch, stashed, upstream}.
+
+    branch is None on a detached HEAD. Returns None outside a repository and
+    for layouts this reader does not understand (reftable refs, symbolic refs
+    outside refs/heads), so callers fall back to running git.
+    """
+    dirs = _find_git_dirs(cwd)
+    if dirs is None:
+        return None
+    root, git_dir, common_dir = dirs
+    if os.path.isdir(os.path.join(common_dir, "reftable")):
+        return None
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    if head.startswith("ref: refs/heads/"):
+        branch = head[len("ref: refs/heads/") :]
+    elif re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", head):
+        branch = None
+    else:
+        return None
+    # Every stash entry is one line of the stash reflog
+    try:
+        with open(os.path.join(common_dir, "logs", "refs", "stash"), "rb") as f:
+            stashed = sum(1 for _ in f)
+    except OSError:
+        stashed = 0
+    return {
+        "root": root,
+        "git_dir": git_dir,
+        "common_dir": common_dir,
+        "branch": branch,
+        "stashed": stashed,
+        "upstream": _git_config_upstream(common_dir, branch) if branch else None,
+    }
+
+
+def get_git_branch(cwd):
+    """Get current git branch, or None"""
+    if _has_segment("git_status"):
+        # The status probe runs anyway; take the branch from it
+        probe = _cached_git(cwd, "probe", _git_probe)
+        return probe["branch"] if probe else None
+    meta = _read_git_metadata(cwd)
+    if meta is not None:
+        return meta["branch"]
+    return _cached_git(cwd, "branch", _git_branch_command)
+
+
+def get_git_status(cwd):
+    """Get git status indicators (staged, modified, etc.)"""
+    probe = _cached_git(cwd, "probe", _git_probe)
+    if not probe:
+        return None
+    status = probe["status"]
+    if not status["stashed"]:
+        # git < 2.35 has no stash header in porcelain v2; count the reflog instead
+        meta = _read_git_metadata(cwd)
+        if meta and meta["stashed"]:
+            status = dict(status, stashed=meta["stashed"])
+    return status
+
+
+# =============================================================================
+# USAGE LIMITS API
+# =============================================================================
+
+USAGE_CACHE_PATH = os.path.join(CACHE_DIR, ".usage_cache.json")
+UPDATE_CACHE_PATH = os.path.join(CACHE_DIR, ".update_cache.json")
+STATUSLINE_CACHE_PATH = os.path.join(CACHE_DIR, ".statusline_cache.json")
+CREDENTIALS_PATH = os.path.expanduser("~/.claude/.credentials.json")
+INSTALLED_VERSION_CACHE_PATH = os.path.join(CACHE_DIR, ".installed_version_cache.json")
+_INSTALLED_VERSION = {}  # binary fingerprint -> version, for the daemon
+
+# Caches derived from local state, safe to drop at any time (--bench cold runs).
+# Network caches (usage, update, statusline) are not listed: dropping them
+# would trigger refreshes.
+DERIVED_CACHE_FILES = [
+    PALETTE_CACHE_PATH,
+    GIT_CACHE_PATH,
+    INSTALLED_VERSION_CACHE_PATH,
+    os.path.join(CACHE_DIR, ".render_cache"),
+    os.path.join(CACHE_DIR, ".plugin_manifest.json"),
+    os.path.join(CACHE_DIR, ".plugin_state.json"),
+    os.path.join(CACHE_DIR, ".plugin_cache"),
+]
+
+
+def _reset_caches():
+    """Forget in-memory memos and delete the derived cache files."""
+    global _GIT_CACHE
+    _GIT_CACHE = None
+    _GIT_PROBES.clear()
+    _INSTALLED_VERSION.clear()
+    for path in DERIVED_CACHE_FILES:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def _normalize_usage_data(rate_limits):
+    """Convert rate_limits from CC stdin JSON to internal usage format.
+
+    CC 2.1.80+ sends: {used_percentage: float, resets_at: unix_timestamp}
+    Internal format:  {utilization: int, resets_at: ISO8601_string}
+    """
+    if not rate_limits:
+        return None
+    result = {}
+    for key in ("five_hour", "seven_day"):
+        window = rate_limits.get(key)
+        if not window:
+            continue
+        used_pct = window.get("used_percentage")
+        resets_at = window.get("resets_at")
+        if used_pct is None or resets_at is None:
+            continue
+        reset_dt = datetime.fromtimestamp(resets_at, tz=timezone.utc)
+        result[key] = {
+            "utilization": used_pct,
+            "resets_at": reset_dt.isoformat(),
         }
     return result or None
 
@@ -697,10 +1429,74 @@ def _extract_scoped_usage(data, model_name):
     return None
 
 
+# --- Stale-while-revalidate ---
+# Renders never wait on the network. An expired cache is served as-is while a
+# detached `--refresh NAME` process fetches the new value and rewrites the
+# cache atomically. A failed refresh records failed_at, which holds off the
+# next attempt for the source's retry interval. Refreshes are single-flight
+# across sessions: an flock on <cache>.lock admits one refresher per cache.
+
+_STALE_SOURCES = set()  # sources served from an expired cache in this render
+
+
+class _RefreshLock:
+    """flock on <cache_path>.lock; `acquired` tells whether this process holds it."""
+
+    def __init__(self, cache_path, wait=False):
+        self.path = cache_path + ".lock"
+        self.wait = wait
+        self.fd = None
+        self.acquired = False
+
+    def __enter__(self):
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self.fd, fcntl.LOCK_EX if self.wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.acquired = True
+        except OSError:
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            os.close(self.fd)  # releases the flock
+        return False
+
+
+def _refresh_in_flight(cache_path):
+    """Whether another process holds the refresh lock for cache_path."""
+    with _RefreshLock(cache_path) as lock:
+        return lock.fd is not None and not lock.acquired
+
+
+def _spawn_refresh(name):
+    """Start a detached `--refresh name` process unless one is already running.
+
+    The render does not wait for it.
+    """
+    if _refresh_in_flight(REFRESHERS[name][0]):
+        return
+    try:
+        subprocess.Popen(
+            [sys.executable, get_script_path(), "--refresh", name],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        pass
+
+
+def _record_refresh_failure(path, cache, **fields):
+    """Keep the last good value but note the failed attempt (starts the retry cooldown)."""
+    _write_json_atomic(path, dict(cache or {}, failed_at=time.time(), **fields))
+
+
 def get_oauth_token():
     """Get OAuth access token from macOS Keychain or credentials file.
 
-    Deprecated: Only used by fetch_usage_data() which is itself deprecated.
+    Deprecated: Only used by refresh_usage_data(), which is itself deprecated.
     Will be removed in a future version.
     """
     # On macOS, try Keychain first
@@ -734,85 +1530,102 @@ def get_oauth_token():
 
 
 def fetch_usage_data():
-    """Fetch usage data from Anthropic OAuth API, with caching.
+    """Usage data from the OAuth API cache, never blocking on the network.
 
     Deprecated: CC 2.1.80+ provides rate_limits in stdin JSON. This function
     is kept as a fallback for older CC versions and will be removed in a
     future version along with get_oauth_token() and USAGE_CACHE_PATH.
-    """
-    # Check cache first
-    try:
-        if os.path.exists(USAGE_CACHE_PATH):
-            with open(USAGE_CACHE_PATH) as f:
-                cache = json.load(f)
-            if time.time() - cache.get("timestamp", 0) < USAGE_CACHE_DURATION:
-                return cache.get("data")
-    except (OSError, json.JSONDecodeError):
-        pass
 
-    # Get OAuth token and validate it contains only safe characters
-    token = get_oauth_token()
-    if not token:
-        return None
-    if not all(c.isalnum() or c in "-._~+/=" for c in token):
+    An expired cache is returned as-is while refresh_usage_data() runs in the
+    background; with no cache at all this returns None until it finishes.
+    """
+    cache = _read_json(USAGE_CACHE_PATH)
+    now = time.time()
+    if _usage_refresh_due(cache, now):
+        _spawn_refresh("usage")
+    if cache is None:
         return None
+    data = cache.get("data")
+    if data is not None and now - cache.get("timestamp", 0) >= USAGE_CACHE_DURATION:
+        _STALE_SOURCES.add("usage")
+    return data
 
-    # Fetch from API using curl (token passed via --config stdin to hide from ps)
-    try:
-        result = subprocess.run(
-            [
-                "curl",
-                "-s",
-                "-f",
-                "--config",
-                "-",
-                "-H",
-                "Accept: application/json",
-                "-H",
-                "Content-Type: application/json",
-                "-H",
-                "User-Agent: claude-code/2.0.32",
-                "-H",
-                "anthropic-beta: oauth-2025-04-20",
-                "https://api.anthropic.com/api/oauth/usage",
-            ],
-            input=f'header = "Authorization: Bearer {token}"\n',
-            capture_output=True,
-            text=True,
-            timeout=5,
-        )
-        if result.returncode != 0:
-            return None
 
-        data = json.loads(result.stdout)
+def _usage_refresh_due(cache, now):
+    """Expired and not inside the cooldown after a failed refresh."""
+    if cache is None:
+        return True
+    return (
+        now - cache.get("timestamp", 0) >= USAGE_CACHE_DURATION
+        and now - cache.get("failed_at", 0) >= USAGE_CACHE_DURATION
+    )
+
 
-        # Cache the result atomically to avoid corruption from concurrent reads
-        tmp_path = None
+def refresh_usage_data():
+    """Fetch usage data from Anthropic OAuth API and cache it (blocking)."""
+    data = None
+    # Get OAuth token and validate it contains only safe characters
+    token = get_oauth_token()
+    if token and all(c.isalnum() or c in "-._~+/=" for c in token):
+        # Fetch from API using curl (token passed via --config stdin to hide from ps)
         try:
-            cache_dir = os.path.dirname(USAGE_CACHE_PATH)
-            fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
-            with os.fdopen(fd, "w") as f:
-                json.dump({"timestamp": time.time(), "data": data}, f)
-            os.replace(tmp_path, USAGE_CACHE_PATH)
-        except OSError:
-            if tmp_path:
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    pass
+            result = subprocess.run(
+                [
+                    "curl",
+                    "-s",
+                    "-f",
+                    "--config",
+                    "-",
+                    "-H",
+                    "Accept: application/json",
+                    "-H",
+                    "Content-Type: application/json",
+                    "-H",
+                    "User-Agent: claude-code/2.0.32",
+                    "-H",
+                    "anthropic-beta: oauth-2025-04-20",
+                    "https://api.anthropic.com/api/oauth/usage",
+                ],
+                input=f'header = "Authorization: Bearer {token}"\n',
+                capture_output=True,
+                text=True,
+                timeout=5,
+            )
+            if result.returncode == 0:
+                data = json.loads(result.stdout)
+        except (subprocess.TimeoutExpired, json.JSONDecodeError, FileNotFoundError):
+            pass
 
-        return data
-    except (subprocess.TimeoutExpired, json.JSONDecodeError, FileNotFoundError):
+    if data is None:
+        cache = _read_json(USAGE_CACHE_PATH)
+        _record_refresh_failure(USAGE_CACHE_PATH, cache or {"timestamp": 0, "data": None})
         return None
 
+    # Cache the result atomically to avoid corruption from concurrent reads
+    _write_json_atomic(USAGE_CACHE_PATH, {"timestamp": time.time(), "data": data})
+    return data
+
 
 # =============================================================================
 # UPDATE CHECKER
 # =============================================================================
 
 
-def get_installed_version():
-    """Get installed Claude Code version."""
+def _claude_binary_fingerprint():
+    """[resolved path, mtime_ns, inode, size] of the claude binary on PATH, or None."""
+    path = shutil.which("claude")
+    if not path:
+        return None
+    real = os.path.realpath(path)
+    try:
+        st = os.stat(real)
+    except OSError:
+        return None
+    return [real, st.st_mtime_ns, st.st_ino, st.st_size]
+
+
+def _probe_installed_version():
+    """Run `claude --version` (starts the whole CLI, so callers cache it)."""
     try:
         result = subprocess.run(
             ["claude", "--version"],
@@ -828,6 +1641,33 @@ def get_installed_version():
     return None
 
 
+def get_installed_version():
+    """Get installed Claude Code version.
+
+    Cached on the resolved binary's path, mtime, inode and size, so
+    `claude --version` runs again only after the binary is replaced.
+    """
+    fp = _claude_binary_fingerprint()
+    if fp is None:
+        return _probe_installed_version()
+    key = json.dumps(fp)
+    if key in _INSTALLED_VERSION:
+        return _INSTALLED_VERSION[key]
+    try:
+        with open(INSTALLED_VERSION_CACHE_PATH) as f:
+            cache = json.load(f)
+        if cache.get("binary") == fp and cache.get("version"):
+            _INSTALLED_VERSION[key] = cache["version"]
+            return cache["version"]
+    except (OSError, json.JSONDecodeError, AttributeError):
+        pass
+    version = _probe_installed_version()
+    if version:
+        _INSTALLED_VERSION[key] = version
+        _write_json_atomic(INSTALLED_VERSION_CACHE_PATH, {"binary": fp, "version": version})
+    return version
+
+
 def parse_semver(version):
     """Parse semver string to tuple for comparison."""
     try:
@@ -886,44 +1726,55 @@ def _fetch_version_from_custom_cmd(retries=3):
     return None
 
 
+def _update_retry_cooldown(failed_source):
+    # Use shorter retry for custom source failures (more likely to be transient)
+    return UPDATE_CUSTOM_RETRY_DURATION if failed_source == "custom" else UPDATE_RETRY_DURATION
+
+
 def fetch_latest_version():
-    """Fetch latest Claude Code version, with caching.
+    """Latest Claude Code version from the update cache, never blocking on the network.
 
     Returns (version, source) tuple where source is:
     - "npm": no custom command configured, used npm
     - "custom": custom command succeeded
     - "npm_fallback": custom command failed, fell back to npm
-    Returns (None, None) if both fail.
+    Returns (None, None) if both fail, or while the first fetch is running.
+    An expired entry is served while refresh_latest_version() runs in the
+    background.
     """
-    cached_version = None
-    cached_source = None
+    cache = _read_json(UPDATE_CACHE_PATH)
+    now = time.time()
+    if _update_refresh_due(cache, now):
+        _spawn_refresh("update")
+    # Invalidate cache if version_cmd changed
+    if cache is None or cache.get("version_cmd", "") != UPDATE_VERSION_CMD:
+        return (None, None)
+    cached_version = cache.get("version")
+    if not cached_version:
+        return (None, None)  # Failure cooldown, or retry in progress
+    if now - cache.get("timestamp", 0) >= UPDATE_CACHE_DURATION:
+        _STALE_SOURCES.add("update")  # Stale is better than nothing
+    return (cached_version, cache.get("source", "npm"))
+
+
+def _update_refresh_due(cache, now):
+    # Success cache: use UPDATE_CACHE_DURATION (1h default)
+    # Failure cache: use UPDATE_RETRY_DURATION (10min) or UPDATE_CUSTOM_RETRY_DURATION (2min)
+    if cache is None or cache.get("version_cmd", "") != UPDATE_VERSION_CMD:
+        return True
+    age = now - cache.get("timestamp", 0)
+    cooldown = _update_retry_cooldown(cache.get("failed_source"))
+    if cache.get("version"):
+        return age >= UPDATE_CACHE_DURATION and now - cache.get("failed_at", 0) >= cooldown
+    return age >= cooldown
 
-    # Check cache first
-    try:
-        if os.path.exists(UPDATE_CACHE_PATH):
-            with open(UPDATE_CACHE_PATH) as f:
-                cache = json.load(f)
-            # Invalidate cache if version_cmd changed
-            if cache.get("version_cmd", "") != UPDATE_VERSION_CMD:
-                pass  # Skip cache, fetch fresh
-            else:
-                age = time.time() - cache.get("timestamp", 0)
-                cached_version = cache.get("version")
-                cached_source = cache.get("source", "npm")
-                # Success cache: use UPDATE_CACHE_DURATION (1h default)
-                # Failure cache: use UPDATE_RETRY_DURATION (10min) or UPDATE_CUSTOM_RETRY_DURATION (2min)
-                if cached_version:
-                    if age < UPDATE_CACHE_DURATION:
-                        return (cached_version, cached_source)
-                else:
-                    # Use shorter retry for custom source failures (more likely to be transient)
-                    failed_source = cache.get("failed_source")
-                    cooldown = UPDATE_CUSTOM_RETRY_DURATION if failed_source == "custom" else UPDATE_RETRY_DURATION
-                    if age < cooldown:
-                        return (None, None)  # Still in failure cooldown
-    except (OSError, json.JSONDecodeError):
-        pass
 
+def refresh_latest_version():
+    """Fetch the latest Claude Code version and cache it (blocking).
+
+    Returns (version, source) like fetch_latest_version(); a failed fetch
+    keeps returning the last cached version.
+    """
     version = None
     source = None
 
@@ -943,11 +1794,6 @@ def fetch_latest_version():
         if version:
             source = "npm"
 
-    # If fetch failed but we have a cached version, return it (stale is better than nothing)
-    if version is None and cached_version:
-        return (cached_version, cached_source)
-
-    # Cache result (success or failure) atomically
     # Track failed_source to use shorter retry for custom command failures
     failed_source = None
     if version is None and UPDATE_VERSION_CMD:
@@ -955,35 +1801,35 @@ def fetch_latest_version():
     elif source == "npm_fallback":
         failed_source = "custom"  # Custom command failed, fell back to npm
 
-    tmp_path = None
-    try:
-        cache_dir = os.path.dirname(UPDATE_CACHE_PATH)
-        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
-        with os.fdopen(fd, "w") as f:
-            json.dump(
-                {
-                    "timestamp": time.time(),
-                    "version": version,
-                    "source": source,
-                    "version_cmd": UPDATE_VERSION_CMD,
-                    "failed_source": failed_source,
-                },
-                f,
-            )
-        os.replace(tmp_path, UPDATE_CACHE_PATH)
-    except OSError:
-        if tmp_path:
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
+    # If fetch failed but we have a cached version, keep it (stale is better than nothing)
+    if version is None:
+        cache = _read_json(UPDATE_CACHE_PATH)
+        if cache and cache.get("version") and cache.get("version_cmd", "") == UPDATE_VERSION_CMD:
+            _record_refresh_failure(UPDATE_CACHE_PATH, cache, failed_source=failed_source)
+            return (cache["version"], cache.get("source", "npm"))
+
+    # Cache result (success or failure) atomically
+    _write_json_atomic(
+        UPDATE_CACHE_PATH,
+        {
+            "timestamp": time.time(),
+            "version": version,
+            "source": source,
+            "version_cmd": UPDATE_VERSION_CMD,
+            "failed_source": failed_source,
+        },
+    )
 
     return (version, source)
 
 
-def check_for_update():
-    """Check if update available. Returns (installed, latest, source) or None."""
-    installed = get_installed_version()
+def check_for_update(data=None):
+    """Check if update available. Returns (installed, latest, source) or None.
+
+    The running version from stdin (`version`) is preferred over probing the
+    installed binary.
+    """
+    installed = (data or {}).get("version") or get_installed_version()
     if not installed:
         return None
 
@@ -997,23 +1843,29 @@ def check_for_update():
 
 
 def fetch_latest_statusline_version():
-    """Fetch latest status line version from GitHub, with caching."""
-    cached_version = None
+    """Latest status line version from the GitHub cache, never blocking on the network."""
+    cache = _read_json(STATUSLINE_CACHE_PATH)
+    now = time.time()
+    if _statusline_refresh_due(cache, now):
+        _spawn_refresh("statusline")
+    if cache is None or not cache.get("version"):
+        return None
+    if now - cache.get("timestamp", 0) >= STATUSLINE_CACHE_DURATION:
+        _STALE_SOURCES.add("statusline")
+    return cache["version"]
 
-    try:
-        if os.path.exists(STATUSLINE_CACHE_PATH):
-            with open(STATUSLINE_CACHE_PATH) as f:
-                cache = json.load(f)
-            age = time.time() - cache.get("timestamp", 0)
-            cached_version = cache.get("version")
-            if cached_version:
-                if age < STATUSLINE_CACHE_DURATION:
-                    return cached_version
-            elif age < UPDATE_RETRY_DURATION:
-                return None
-    except (OSError, json.JSONDecodeError):
-        pass
 
+def _statusline_refresh_due(cache, now):
+    if cache is None:
+        return True
+    age = now - cache.get("timestamp", 0)
+    if cache.get("version"):
+        return age >= STATUSLINE_CACHE_DURATION and now - cache.get("failed_at", 0) >= UPDATE_RETRY_DURATION
+    return age >= UPDATE_RETRY_DURATION
+
+
+def refresh_latest_statusline_version():
+    """Fetch the latest status line version from GitHub and cache it (blocking)."""
     version = None
     try:
         result = subprocess.run(
@@ -1034,26 +1886,36 @@ def fetch_latest_statusline_version():
     except (subprocess.TimeoutExpired, json.JSONDecodeError, FileNotFoundError):
         pass
 
-    if version is None and cached_version:
-        return cached_version
+    if version is None:
+        cache = _read_json(STATUSLINE_CACHE_PATH)
+        if cache and cache.get("version"):
+            _record_refresh_failure(STATUSLINE_CACHE_PATH, cache)
+            return cache["version"]
 
-    tmp_path = None
-    try:
-        cache_dir = os.path.dirname(STATUSLINE_CACHE_PATH)
-        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
-        with os.fdopen(fd, "w") as f:
-            json.dump({"timestamp": time.time(), "version": version}, f)
-        os.replace(tmp_path, STATUSLINE_CACHE_PATH)
-    except OSError:
-        if tmp_path:
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
+    _write_json_atomic(STATUSLINE_CACHE_PATH, {"timestamp": time.time(), "version": version})
 
     return version
 
 
+# --refresh NAME entry points (run detached by _spawn_refresh): (cache, due, refresh)
+REFRESHERS = {
+    "usage": (USAGE_CACHE_PATH, _usage_refresh_due, refresh_usage_data),
+    "update": (UPDATE_CACHE_PATH, _update_refresh_due, refresh_latest_version),
+    "statusline": (STATUSLINE_CACHE_PATH, _statusline_refresh_due, refresh_latest_statusline_version),
+}
+
+
+def run_refresh(name):
+    """Refresh one cache unless another process already is (single-flight)."""
+    if name not in REFRESHERS:
+        return
+    cache_path, due, refresh = REFRESHERS[name]
+    with _RefreshLock(cache_path) as lock:
+        # Re-check under the lock: the previous holder may have just refreshed it
+        if lock.acquired and due(_read_json(cache_path), time.time()):
+            refresh()
+
+
 def check_for_statusline_update():
     """Check if statusline update available. Returns latest version or None."""
     latest = fetch_latest_statusline_version()
@@ -1075,7 +1937,9 @@ def perform_self_update():
     print(f"Current version: {VERSION}")
     print("Checking for updates...")
 
-    latest = fetch_latest_statusline_version()
+    # Wait for any background refresher rather than racing it
+    with _RefreshLock(STATUSLINE_CACHE_PATH, wait=True):
+        latest = refresh_latest_statusline_version()
     if not latest:
         print("Error: Could not fetch latest version info")
         return 1
@@ -1135,19 +1999,20 @@ def perform_self_update():
         return 1
 
 
-def get_usage_color(ratio):
-    """Get foreground color for usage indicator based on time/usage ratio."""
-    theme = THEMES[THEME]
+def _gauge_zone(ratio):
+    """Theme color key for a time/usage ratio: light, green, yellow or red."""
     if ratio >= 1 / 0.75:
-        rgb, fallback = theme["usage_light"]
-    elif ratio >= 1.0:
-        rgb, fallback = theme["usage_green"]
-    elif ratio >= 0.75:
-        rgb, fallback = theme["usage_yellow"]
-    else:
-        rgb, fallback = theme["usage_red"]
+        return "usage_light"
+    if ratio >= 1.0:
+        return "usage_green"
+    if ratio >= 0.75:
+        return "usage_yellow"
+    return "usage_red"
 
-    return _color(rgb, fallback, is_bg=False)
+
+def get_usage_color(ratio):
+    """Get foreground color for usage indicator based on time/usage ratio."""
+    return _fg(_gauge_zone(ratio))
 
 
 def get_usage_gauge(ratio):
@@ -1156,44 +2021,30 @@ def get_usage_gauge(ratio):
     - ratio > 1 (ahead): fills from TOP with green, using BG/FG trick
     - ratio < 1 (behind): fills from BOTTOM with yellow/red, FG only
     """
-    theme = THEMES[THEME]
+    if ratio >= 1.0:
+        level = min(1.0, ratio - 1.0)  # 0 = exactly on track, 1 = way ahead
+    else:
+        level = min(1.0, 1.0 - ratio)  # 0 = on track, 1 = critical
+    index = max(0, min(7, int(level * 7.99)))
+    return _vertical_gauge(_gauge_zone(ratio), index)
+
+
+@functools.lru_cache(maxsize=None)
+def _vertical_gauge(zone, index):
+    """Rendered vertical gauge for a color zone and fill step 0-7 (at most 32 per theme)."""
     gauges = "▁▂▃▄▅▆▇█"  # fills from bottom
 
-    if ratio >= 1.0:
+    if zone in ("usage_light", "usage_green"):
         # Ahead - show how much ahead, filling from top (green)
         # Use BG = green, FG = empty to create top-fill illusion
-        ahead = min(1.0, ratio - 1.0)  # 0 = exactly on track, 1 = way ahead
-
-        empty_rgb, empty_fb = theme["bar_empty"]
-        ahead_key = "usage_light" if ratio >= 1 / 0.75 else "usage_green"
-        green_rgb, green_fb = theme[ahead_key]
-
         # Invert gauge for top-fill: more ahead = more visible from top
-        index = int(ahead * 7.99)
-        index = max(0, min(7, index))
         # Use █ (full FG) when minimal - shows dark (empty), not green
         char = gauges[7 - index] if index > 0 else "█"
-
-        bg = _color(green_rgb, green_fb, is_bg=True)
-        fg = _color(empty_rgb, empty_fb, is_bg=False)
-        return f"{bg}{fg}{char}{RESET}"
+        return f"{_bg(zone)}{_fg('bar_empty')}{char}{RESET}"
     # Behind - show how much behind, filling from bottom (yellow/red)
-    behind = min(1.0, 1.0 - ratio)  # 0 = on track, 1 = critical
-
-    empty_rgb, empty_fb = theme["bar_empty"]
-    if ratio >= 0.75:
-        warn_rgb, warn_fb = theme["usage_yellow"]
-    else:
-        warn_rgb, warn_fb = theme["usage_red"]
-
-    index = int(behind * 7.99)
-    index = max(0, min(7, index))
     # Use space if index is 0 (too small to show)
     char = gauges[index] if index > 0 else " "
-
-    bg = _color(empty_rgb, empty_fb, is_bg=True)
-    fg = _color(warn_rgb, warn_fb, is_bg=False)
-    return f"{bg}{fg}{char}{RESET}"
+    return f"{_bg('bar_empty')}{_fg(zone)}{char}{RESET}"
 
 
 def get_usage_gauge_blocks(ratio, gauge_width=4):
@@ -1205,58 +2056,50 @@ def get_usage_gauge_blocks(ratio, gauge_width=4):
     - ratio < 1.0: orange fills right half
     - ratio < 0.75: red instead of orange
     """
-    theme = THEMES[THEME]
-    BLOCKS = " ▏▎▍▌▋▊▉█"
     half = gauge_width // 2
-    empty_rgb, empty_fb = theme["bar_empty"]
-    ahead_key = "usage_light" if ratio >= 1 / 0.75 else "usage_green"
-    green_rgb, green_fb = theme[ahead_key]
-    empty_bg = _color(empty_rgb, empty_fb, is_bg=True)
+    if ratio >= 1.0:
+        level = min(1.0, ratio - 1.0)
+    else:
+        level = min(1.0, 1.0 - ratio)
+    return _blocks_gauge(_gauge_zone(ratio), half, round(level * half * 8))
 
-    parts = []
 
-    if ratio >= 1.0:
-        ahead = min(1.0, ratio - 1.0)
-        total = round(ahead * half * 8)
-        filled = total // 8
-        partial = total % 8
-        empty = half - filled - (1 if partial > 0 else 0)
+@functools.lru_cache(maxsize=None)
+def _blocks_gauge(zone, half, total):
+    """Rendered blocks gauge for a color zone, half width and fill in eighths.
+
+    There are only half*8+1 fill levels per zone, so each width renders at most
+    a few dozen distinct strings; the renderers and the demos share them.
+    """
+    BLOCKS = " ▏▎▍▌▋▊▉█"
+    empty_bg = _bg("bar_empty")
+    filled = total // 8
+    partial = total % 8
+    empty = half - filled - (1 if partial > 0 else 0)
+
+    parts = []
 
+    if zone in ("usage_light", "usage_green"):
         # Left half: [empty...][transition][filled...] (green grows right-to-left)
         if empty > 0:
             parts.append(f"{empty_bg}{' ' * empty}")
         if partial > 0:
-            green_bg = _color(green_rgb, green_fb, is_bg=True)
-            empty_fg = _color(empty_rgb, empty_fb, is_bg=False)
-            parts.append(f"{green_bg}{empty_fg}{BLOCKS[8 - partial]}")
+            parts.append(f"{_bg(zone)}{_fg('bar_empty')}{BLOCKS[8 - partial]}")
         if filled > 0:
-            green_fg = _color(green_rgb, green_fb, is_bg=False)
-            parts.append(f"{green_fg}{'█' * filled}")
+            parts.append(f"{_fg(zone)}{'█' * filled}")
 
         # Right half: all empty
         parts.append(f"{empty_bg}{' ' * half}")
     else:
-        behind = min(1.0, 1.0 - ratio)
-
-        if ratio >= 0.75:
-            warn_rgb, warn_fb = theme["usage_yellow"]
-        else:
-            warn_rgb, warn_fb = theme["usage_red"]
-
-        total = round(behind * half * 8)
-        filled = total // 8
-        partial = total % 8
-        empty = half - filled - (1 if partial > 0 else 0)
+        warn_fg = _fg(zone)
 
         # Left half: all empty
         parts.append(f"{empty_bg}{' ' * half}")
 
         # Right half: [filled...][transition][empty...] (warn grows left-to-right)
         if filled > 0:
-            warn_fg = _color(warn_rgb, warn_fb, is_bg=False)
             parts.append(f"{warn_fg}{'█' * filled}")
         if partial > 0:
-            warn_fg = _color(warn_rgb, warn_fb, is_bg=False)
             parts.append(f"{empty_bg}{warn_fg}{BLOCKS[partial]}")
         if empty > 0:
             parts.append(f"{empty_bg}{' ' * empty}")
@@ -1376,32 +2219,214 @@ def _format_burndown(seconds_to_depletion, seconds_early, seconds_until_end, ver
     return f"about{NB}{depletion}{NB}usage{NB}left"
 
 
-def format_usage_indicators(usage_data):
-    """Format usage indicators, returning dict of {segment_name: rendered_string}."""
-    if usage_data is None:
-        na_text = f"   {text_color('na')}usage: N/A"
-        return {"usage_5hour": na_text, "usage_weekly": "", "usage_fable": ""}
-    if not usage_data:
-        return {"usage_5hour": "", "usage_weekly": "", "usage_fable": ""}
+# =============================================================================
+# USAGE HISTORY
+# =============================================================================
 
-    results = {}
+"""
+Usage samples seen by any session, in CACHE_DIR/.usage_history.bin: an
+8-byte header, then fixed-width records of
+  timestamp f64 | resets_at f64 | utilization f32 | window u8 | 3 pad bytes
+in append order. Writers append under the file's flock (see _RefreshLock),
+dropping their sample rather than waiting when another session holds it,
+and skip a sample equal to the window's previous one, unless that is older
+than USAGE_HISTORY_HEARTBEAT. Past USAGE_HISTORY_MAX_RECORDS the file is
+compacted: windows that have reset keep only their final sample, then the
+oldest records go. Readers mmap it without locking; compaction replaces the
+file atomically and a torn trailing record is ignored.
+"""
 
-    # Define limit types: (api_key, window_hours, time_format, segment_name)
-    # Use NBSP (\u00a0) between day and time for weekly
-    # seven_day_fable shares the weekly window; it is populated only when the
-    # OAuth API supplies a scoped limit (see _extract_scoped_usage).
-    limit_configs = [
-        ("five_hour", 5, "%H:%M", "usage_5hour"),
-        ("seven_day", 7 * 24, "%a\u00a0%H:%M", "usage_weekly"),
-        ("seven_day_fable", 7 * 24, "%a\u00a0%H:%M", "usage_fable"),
-    ]
+USAGE_HISTORY_PATH = os.path.join(CACHE_DIR, ".usage_history.bin")
+USAGE_HISTORY_MAGIC = b"SLUH\x01\x00\x00\x00"
+USAGE_HISTORY_WINDOWS = ("five_hour", "seven_day", "seven_day_fable")  # index = window code
+USAGE_HISTORY_MAX_RECORDS = 20000  # ~470 KiB
+USAGE_HISTORY_HEARTBEAT = 600  # seconds; an unchanged window is re-sampled this often
+_USAGE_RECORD = struct.Struct("<ddfB3x")
 
-    for api_key, window_hours, time_fmt, segment_name in limit_configs:
-        if not _has_segment(segment_name):
-            results[segment_name] = ""
-            continue
 
-        opts = _segment_opts(segment_name)
+def _reset_timestamp(resets_at):
+    """Unix time of an ISO 8601 resets_at (naive means UTC), or None."""
+    try:
+        reset_dt = datetime.fromisoformat(resets_at.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if reset_dt.tzinfo is None:
+        reset_dt = reset_dt.replace(tzinfo=timezone.utc)
+    return reset_dt.timestamp()
+
+
+def _same_window(resets_a, resets_b):
+    return abs(resets_a - resets_b) < 60  # the API jitters resets_at by seconds
+
+
+def record_usage_history(usage_data):
+    """Append this render's usage windows to the history (deduplicated)."""
+    if not USAGE_HISTORY or not usage_data:
+        return
+    samples = []
+    for code, window in enumerate(USAGE_HISTORY_WINDOWS):
+        limit = usage_data.get(window) or {}
+        resets = _reset_timestamp(limit.get("resets_at"))
+        if resets is not None:
+            samples.append((code, float(limit.get("utilization", 0)), resets))
+    if not samples:
+        return
+    size = 0
+    # Never wait on the render path: while another session appends or compacts,
+    # skip this sample; the heartbeat makes a dropped one harmless
+    with _RefreshLock(USAGE_HISTORY_PATH) as lock:
+        if not lock.acquired:
+            return
+        try:
+            with open(USAGE_HISTORY_PATH, "ab+") as f:
+                size = f.tell()
+                if size < len(USAGE_HISTORY_MAGIC):
+                    f.truncate(0)
+                    f.write(USAGE_HISTORY_MAGIC)
+                    size = len(USAGE_HISTORY_MAGIC)
+                    last = {}
+                else:
+                    f.seek(0)
+                    if f.read(len(USAGE_HISTORY_MAGIC)) != USAGE_HISTORY_MAGIC:
+                        return  # Not ours (or a future format): leave it alone
+                    last = _last_usage_samples(f, size)
+                now = time.time()
+                records = []
+                for code, utilization, resets in samples:
+                    previous = last.get(code)
+                    if (
+                        previous
+                        and abs(previous[1] - utilization) < 0.001  # stored as f32
+                        and _same_window(previous[2], resets)
+                        and now - previous[0] < USAGE_HISTORY_HEARTBEAT
+                    ):
+                        continue  # Unchanged since another render sampled it
+                    records.append(_USAGE_RECORD.pack(now, resets, utilization, code))
+                f.write(b"".join(records))
+                size += len(records) * _USAGE_RECORD.size
+        except OSError:
+            return
+        if (size - len(USAGE_HISTORY_MAGIC)) // _USAGE_RECORD.size > USAGE_HISTORY_MAX_RECORDS:
+            _compact_usage_history()
+
+
+def _last_usage_samples(f, size, scan=256):
+    """{window code: (timestamp, utilization, resets_at)} of the newest records."""
+    header = len(USAGE_HISTORY_MAGIC)
+    count = (size - header) // _USAGE_RECORD.size
+    start = max(0, count - scan)
+    f.seek(header + start * _USAGE_RECORD.size)
+    last = {}
+    for timestamp, resets, utilization, code in _USAGE_RECORD.iter_unpack(f.read((count - start) * _USAGE_RECORD.size)):
+        last[code] = (timestamp, utilization, resets)
+    return last
+
+
+def _compact_usage_history():
+    """Shrink the history; the caller holds its lock."""
+    try:
+        with open(USAGE_HISTORY_PATH, "rb") as f:
+            data = f.read()
+    except OSError:
+        return
+    header = len(USAGE_HISTORY_MAGIC)
+    body = data[header : header + (len(data) - header) // _USAGE_RECORD.size * _USAGE_RECORD.size]
+    records = list(_USAGE_RECORD.iter_unpack(body))
+    now = time.time()
+    # A window that has reset only needs its final utilization
+    final = {}
+    for index, (_timestamp, resets, _utilization, code) in enumerate(records):
+        if resets < now:
+            final[(code, round(resets / 60))] = index
+    keep = [r for i, r in enumerate(records) if r[1] >= now or final.get((r[3], round(r[1] / 60))) == i]
+    keep = keep[-(USAGE_HISTORY_MAX_RECORDS // 2) :]
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(USAGE_HISTORY_PATH))
+        with os.fdopen(fd, "wb") as f:
+            f.write(USAGE_HISTORY_MAGIC + b"".join(_USAGE_RECORD.pack(*r) for r in keep))
+        os.replace(tmp_path, USAGE_HISTORY_PATH)
+    except OSError:
+        if tmp_path:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def usage_history(window, since=None, resets_at=None):
+    """Recorded samples of a usage window as [(timestamp, utilization, resets_at)], oldest first.
+
+    window is "five_hour", "seven_day" or "seven_day_fable"; since (unix time)
+    skips older samples by binary search; resets_at (unix time) keeps one
+    window instance only.
+    """
+    import mmap
+
+    if window not in USAGE_HISTORY_WINDOWS:
+        return []
+    code = USAGE_HISTORY_WINDOWS.index(window)
+    header = len(USAGE_HISTORY_MAGIC)
+    try:
+        with open(USAGE_HISTORY_PATH, "rb") as f:
+            if os.fstat(f.fileno()).st_size < header + _USAGE_RECORD.size:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[:header] != USAGE_HISTORY_MAGIC:
+                    return []
+                count = (len(mm) - header) // _USAGE_RECORD.size
+                lo, hi = 0, count
+                while since is not None and lo < hi:  # first record at or after since
+                    mid = (lo + hi) // 2
+                    if _USAGE_RECORD.unpack_from(mm, header + mid * _USAGE_RECORD.size)[0] < since:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                body = mm[header + lo * _USAGE_RECORD.size : header + count * _USAGE_RECORD.size]
+    except (OSError, ValueError):
+        return []
+    return [
+        (timestamp, utilization, resets)
+        for timestamp, resets, utilization, record_code in _USAGE_RECORD.iter_unpack(body)
+        if record_code == code and (resets_at is None or _same_window(resets, resets_at))
+    ]
+
+
+def _history_burn_rate(window, resets_at, utilization_pct, now, hours):
+    """Utilization % per second over the last hours of recorded samples, or None (< 1 h of data)."""
+    samples = usage_history(window, since=now - hours * 3600, resets_at=resets_at)
+    if not samples or now - samples[0][0] < 3600:
+        return None
+    first_timestamp, first_utilization, _resets = samples[0]
+    return max(0.0, utilization_pct - first_utilization) / (now - first_timestamp)
+
+
+def format_usage_indicators(usage_data):
+    """Format usage indicators, returning dict of {segment_name: rendered_string}."""
+    if usage_data is None:
+        na_text = f"   {text_color('na')}usage: N/A"
+        return {"usage_5hour": na_text, "usage_weekly": "", "usage_fable": ""}
+    if not usage_data:
+        return {"usage_5hour": "", "usage_weekly": "", "usage_fable": ""}
+
+    results = {}
+
+    # Define limit types: (api_key, window_hours, time_format, segment_name)
+    # Use NBSP (\u00a0) between day and time for weekly
+    # seven_day_fable shares the weekly window; it is populated only when the
+    # OAuth API supplies a scoped limit (see _extract_scoped_usage).
+    limit_configs = [
+        ("five_hour", 5, "%H:%M", "usage_5hour"),
+        ("seven_day", 7 * 24, "%a\u00a0%H:%M", "usage_weekly"),
+        ("seven_day_fable", 7 * 24, "%a\u00a0%H:%M", "usage_fable"),
+    ]
+
+    for api_key, window_hours, time_fmt, segment_name in limit_configs:
+        if not _has_segment(segment_name):
+            results[segment_name] = ""
+            continue
+
+        opts = _segment_opts(segment_name)
         limit = usage_data.get(api_key)
         if not limit:
             results[segment_name] = ""
@@ -1474,6 +2499,15 @@ def format_usage_indicators(usage_data):
             f = elapsed_seconds / (k + elapsed_seconds)
 
             observed_rate = utilization_pct / elapsed_seconds
+            if burndown_opts.get("rate") == "history":
+                # Recent samples instead of the whole-window average
+                try:
+                    rate_hours = float(burndown_opts.get("rate_hours", "24"))
+                except (ValueError, TypeError):
+                    rate_hours = 24
+                recent_rate = _history_burn_rate(api_key, reset_dt.timestamp(), utilization_pct, now.timestamp(), rate_hours)
+                if recent_rate is not None:
+                    observed_rate = recent_rate
             on_track_rate = 100 / effective_window_seconds
             effective_rate = observed_rate * f + on_track_rate * (1 - f)
 
@@ -1505,11 +2539,9 @@ def format_usage_indicators(usage_data):
                         )
                         if burndown_text:
                             results["weekly_burndown"] = burndown_text
-                        theme = THEMES[THEME]
                         # Orange in yellow zone, red in red zone
                         color_key = "usage_yellow" if ratio >= 0.75 else "usage_red"
-                        rgb, fallback = theme[color_key]
-                        results["weekly_burndown_color"] = _color(rgb, fallback, is_bg=False)
+                        results["weekly_burndown_color"] = _fg(color_key)
 
         gauge_style = opts.get("gauge", "blocks")
         gauge_width = int(opts.get("width", "4"))
@@ -1633,10 +2665,7 @@ def _render_worktree(ctx, opts):
 
 
 def _render_git_branch(ctx, opts):
-    cwd = ctx.get("cwd")
-    if not cwd:
-        return ""
-    git_branch = get_git_branch(cwd)
+    git_branch = ctx.get("git_branch")
     if not git_branch:
         return ""
     if opts.get("hide_default") == "1" and git_branch in ("main", "master"):
@@ -1645,10 +2674,7 @@ def _render_git_branch(ctx, opts):
 
 
 def _render_git_status(ctx, opts):
-    cwd = ctx.get("cwd")
-    if not cwd:
-        return ""
-    status = get_git_status(cwd)
+    status = ctx.get("git_status")
     if not status:
         return ""
 
@@ -1719,21 +2745,20 @@ def _render_update(ctx, opts):
     if not update_info:
         return ""
     installed, latest, source = update_info
-    theme = THEMES[THEME]
-    yellow_rgb, yellow_fb = theme["usage_yellow"]
-    color = _color(yellow_rgb, yellow_fb, is_bg=False)
+    color = _fg("usage_yellow")
+    stale = STALE_MARKER if ctx.get("update_stale") else ""
 
     if source == "npm":
         # Standard npm source - simple message
-        return f"   {BOLD}{color}{latest} available! "
+        return f"   {BOLD}{color}{latest} available!{stale} "
     if source == "custom":
         # Custom command succeeded - show custom source label
-        return f"   {BOLD}{color}{latest} available ({UPDATE_VERSION_SOURCE})! "
+        return f"   {BOLD}{color}{latest} available ({UPDATE_VERSION_SOURCE})!{stale} "
     if source == "npm_fallback":
         # Custom command failed, fell back to npm
-        return f"   {BOLD}{color}{latest} available from NPM! Custom source failed. "
+        return f"   {BOLD}{color}{latest} available from NPM! Custom source failed.{stale} "
     # Unknown source - fallback to simple message
-    return f"   {BOLD}{color}{latest} available! "
+    return f"   {BOLD}{color}{latest} available!{stale} "
 
 
 def _render_new_line(ctx, opts):
@@ -1763,6 +2788,298 @@ SEGMENT_RENDERERS = {
 }
 
 
+# =============================================================================
+# DATA PROVIDERS
+# =============================================================================
+
+"""
+Providers gather the data segments consume (update check, usage limits, git,
+effort) and return it as ctx keys. render_status_line() runs only the providers
+that the segments in SEGMENTS declare in SEGMENT_PROVIDERS, so a layout such as
+SL_SEGMENTS='model percentage' runs no git, `claude --version` or usage fetch.
+It is not free of I/O: the status line update check (SL_SHOW_STATUSLINE_UPDATE,
+on by default) still reads its cache, and startup reads the theme cache and
+the plugin directories.
+"""
+
+
+def _provide_usage(data):
+    """Usage gauges and weekly burndown (prefer stdin from CC 2.1.80+, fallback to OAuth API)"""
+    model = data.get("model", {}).get("display_name", "Claude")
+    rate_limits = data.get("rate_limits")
+    oauth_data = None
+    oauth_tried = False
+    if rate_limits:
+        usage_data = _normalize_usage_data(rate_limits)
+    else:
+        oauth_data = fetch_usage_data()  # Deprecated: will be removed in a future version
+        oauth_tried = True
+        usage_data = oauth_data
+
+    # Per-model usage is absent from stdin rate_limits, so usage_fable has to go
+    # to the OAuth API even when stdin already supplied the 5h/7d windows. Only
+    # pay that cost when the segment is actually enabled (result is disk-cached).
+    # Track "tried" rather than "is None" so an offline fetch is not retried here.
+    fable_opts = _segment_opts("usage_fable")
+    fable_model = fable_opts.get("model", "Fable")
+    # only_current=1 restricts the gauge to sessions actually running that model;
+    # skip the fetch too, so an inactive model costs nothing.
+    fable_wanted = _has_segment("usage_fable") and (
+        fable_opts.get("only_current", "0") != "1" or _model_matches(model, fable_model)
+    )
+    if fable_wanted:
+        if not oauth_tried:
+            oauth_data = fetch_usage_data()
+        scoped = _extract_scoped_usage(oauth_data, fable_model)
+        if scoped:
+            usage_data = dict(usage_data or {})
+            usage_data["seven_day_fable"] = scoped
+
+    record_usage_history(usage_data)
+    usage_parts = format_usage_indicators(usage_data)
+    provided = {
+        "usage_5hour": usage_parts["usage_5hour"],
+        "usage_weekly": usage_parts["usage_weekly"],
+        "usage_fable": usage_parts.get("usage_fable", ""),
+        "usage_weekly_burndown": usage_parts.get("weekly_burndown", ""),
+        "usage_weekly_burndown_color": usage_parts.get("weekly_burndown_color", ""),
+    }
+    if STALE_MARKER and "usage" in _STALE_SOURCES:
+        # Only the gauges that came from the OAuth cache are stale
+        for key in ("usage_5hour", "usage_weekly", "usage_fable") if oauth_tried else ("usage_fable",):
+            if provided[key]:
+                provided[key] += STALE_MARKER
+    return provided
+
+
+def _provide_update(data):
+    update_info = check_for_update(data)
+    return {"update_info": update_info, "update_stale": "update" in _STALE_SOURCES}
+
+
+def _provide_git_branch(data):
+    cwd = data.get("cwd", "")
+    return {"git_branch": get_git_branch(cwd) if cwd else None}
+
+
+def _provide_git_status(data):
+    cwd = data.get("cwd", "")
+    return {"git_status": get_git_status(cwd) if cwd else None}
+
+
+def _provide_effort(data):
+    return {"effort_level": get_effort_level(data)}
+
+
+def _provide_statusline_update(data):
+    return {"statusline_update": check_for_statusline_update()}
+
+
+DATA_PROVIDERS = {
+    "update": _provide_update,
+    "usage": _provide_usage,
+    "git_branch": _provide_git_branch,
+    "git_status": _provide_git_status,
+    "effort": _provide_effort,
+    "statusline_update": _provide_statusline_update,
+}
+
+# No I/O; run on the calling thread instead of in the gather pool
+INLINE_PROVIDERS = frozenset({"effort"})
+
+# ctx keys each provider fills in; a segment reading one its requires did not
+# list gets it computed on first read (see _LazyContext)
+PROVIDER_KEYS = {
+    "update": ("update_info", "update_stale"),
+    "usage": ("usage_5hour", "usage_weekly", "usage_fable", "usage_weekly_burndown", "usage_weekly_burndown_color"),
+    "git_branch": ("git_branch",),
+    "git_status": ("git_status",),
+    "effort": ("effort_level",),
+    "statusline_update": ("statusline_update",),
+}
+
+# Providers each segment consumes; segments not listed need none beyond stdin.
+# Plugin segments declare theirs via add_segment(requires=...).
+SEGMENT_PROVIDERS = {
+    "update": ("update",),
+    "model": ("effort",),
+    "git_branch": ("git_branch",),
+    "git_status": ("git_status",),
+    "usage_5hour": ("usage",),
+    "usage_weekly": ("usage",),
+    "usage_fable": ("usage",),
+    "usage_burndown": ("usage",),
+}
+
+
+def _active_providers(skip=()):
+    """Provider names needed by the configured segments, in registry order.
+
+    skip holds SEGMENTS indices the layout will drop anyway (see _segments_beyond_width).
+    """
+    wanted = set()
+    for index, (name, _opts) in enumerate(SEGMENTS):
+        if index not in skip:
+            wanted.update(SEGMENT_PROVIDERS.get(name, ()))
+    if SHOW_STATUSLINE_UPDATE:
+        wanted.add("statusline_update")  # separate line below the bar
+    return [name for name in DATA_PROVIDERS if name in wanted]
+
+
+# --- Latency budget (SL_BUDGET_MS) ---
+# Providers still running when the budget runs out are replaced by the last
+# value they produced for the same directory (persisted, so it works across
+# invocations), or omitted; each replacement is logged for tuning.
+
+PROVIDER_FALLBACK_PATH = os.path.join(CACHE_DIR, ".provider_fallback.json")
+PROVIDER_FALLBACK_MAX_ENTRIES = 64
+BUDGET_LOG_MAX_BYTES = 1024 * 1024  # the budget log moves to <log>.1 past this size
+# Providers whose slow part is I/O (subprocesses, version checks); their
+# output changes rarely, so the file is rewritten only on a real change. usage
+# is left out: its text is derived from the payload and the clock, so a stored
+# copy is stale within a minute and belongs to another session anyway.
+FALLBACK_PROVIDERS = frozenset({"update", "git_branch", "git_status", "statusline_update"})
+_PROVIDER_FALLBACK = None  # "name:cwd" -> last ctx keys; loaded lazily
+
+
+def _provider_fallback_key(name, data):
+    return f"{name}:{data.get('cwd', '')}"
+
+
+def _provider_fallbacks():
+    global _PROVIDER_FALLBACK
+    if _PROVIDER_FALLBACK is None:
+        _PROVIDER_FALLBACK = _read_json(PROVIDER_FALLBACK_PATH) or {}
+    return _PROVIDER_FALLBACK
+
+
+def _remember_provided(data, results):
+    """Store finished provider results as fallbacks; write only when something changed."""
+    fallbacks = _provider_fallbacks()
+    changed = False
+    for name, value in results.items():
+        if name not in FALLBACK_PROVIDERS:
+            continue
+        key = _provider_fallback_key(name, data)
+        # Round-trip through JSON so tuples compare equal to what the file holds
+        value = json.loads(json.dumps(value, default=str))
+        if fallbacks.get(key) != value:
+            fallbacks.pop(key, None)
+            fallbacks[key] = value
+            changed = True
+    while len(fallbacks) > PROVIDER_FALLBACK_MAX_ENTRIES:
+        fallbacks.pop(next(iter(fallbacks)))
+    if changed:
+        _write_json_atomic(PROVIDER_FALLBACK_PATH, fallbacks)
+
+
+def _log_degradation(name, fallback, elapsed_ms):
+    record = {
+        "ts": round(time.time(), 3),
+        "budget_ms": BUDGET_MS,
+        "elapsed_ms": elapsed_ms,
+        "provider": name,
+        "fallback": "cached" if fallback is not None else "omitted",
+    }
+    _PROFILE_RENDER.setdefault("degraded", []).append(record)
+    path = BUDGET_LOG or os.path.join(CACHE_DIR, ".budget.log")
+    try:
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            full = f.tell() >= BUDGET_LOG_MAX_BYTES
+        if full:
+            os.replace(path, path + ".1")  # Keep one previous generation
+    except OSError:
+        pass
+
+
+# Work that may finish after the line is out: main() and the daemon's render
+# copies wait for these threads once the output has been delivered.
+_BACKGROUND = []
+BACKGROUND_LINGER = 60  # seconds waited for them in total before exiting
+
+
+def _join_background():
+    """Wait (up to BACKGROUND_LINGER in total) for the threads in _BACKGROUND."""
+    deadline = time.monotonic() + BACKGROUND_LINGER
+    while _BACKGROUND:
+        _BACKGROUND.pop(0).join(max(0, deadline - time.monotonic()))
+
+
+def _remember_late(data, late, results, started):
+    """Store what providers that missed the budget produce, once they finish.
+
+    Runs after the line is out, so a source that is always slower than the
+    budget still seeds its fallback for the next render.
+    """
+    for thread in late.values():
+        thread.join(max(0, started + GATHER_DEADLINE - time.monotonic()))
+    _remember_provided(data, {name: results[name] for name in late if name in results})
+
+
+def render_deadline():
+    """Monotonic time by which a render starting now must have its data."""
+    return time.monotonic() + (BUDGET_MS / 1000 if BUDGET_MS > 0 else GATHER_DEADLINE)
+
+
+def gather_data(data, deadline=None, skip=()):
+    """Run the active providers concurrently and merge their ctx keys.
+
+    Each I/O provider gets its own daemon thread, so a cold render costs the
+    slowest source rather than the sum. Providers that have not finished by
+    the deadline (SL_BUDGET_MS, else GATHER_DEADLINE) fall back to their last
+    value under a budget, or contribute nothing; providers that raise also
+    contribute nothing. Under a budget, late FALLBACK_PROVIDERS are left to
+    finish after the line is printed (_BACKGROUND) so their result seeds the
+    next render's fallback; any other abandoned thread never delays exit.
+    Segments in skip (SEGMENTS indices) do not pull in their providers.
+    """
+    if deadline is None:
+        deadline = render_deadline()
+    started = time.monotonic()
+    provided = {}
+    results = {}
+
+    timings = _PROFILE_RENDER.setdefault("providers_ms", {})
+
+    def run(name):
+        start = time.perf_counter()
+        try:
+            results[name] = DATA_PROVIDERS[name](data)
+        except Exception:
+            pass  # A failing source must not break the status line
+        timings[name] = _ms_since(start)
+
+    threads = {}
+    for name in _active_providers(skip):
+        if name in INLINE_PROVIDERS:
+            run(name)
+        else:
+            thread = threading.Thread(target=run, args=(name,), daemon=True)
+            thread.start()
+            threads[name] = thread
+    for thread in threads.values():
+        thread.join(max(0, deadline - time.monotonic()))
+    finished = dict(results)  # late threads may still write to results
+    if BUDGET_MS > 0:
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        for name, thread in threads.items():
+            if thread.is_alive():
+                fallback = _provider_fallbacks().get(_provider_fallback_key(name, data))
+                _log_degradation(name, fallback, elapsed_ms)
+                if fallback is not None:
+                    finished[name] = fallback
+        _remember_provided(data, {n: v for n, v in finished.items() if n in threads and not threads[n].is_alive()})
+        late = {n: t for n, t in threads.items() if t.is_alive() and n in FALLBACK_PROVIDERS}
+        if late:
+            finisher = threading.Thread(target=_remember_late, args=(data, late, results, started), daemon=True)
+            finisher.start()
+            _BACKGROUND.append(finisher)
+    for name in DATA_PROVIDERS:
+        provided.update(finished.get(name, {}))
+    return provided
+
+
 # =============================================================================
 # PLUGIN SYSTEM
 # =============================================================================
@@ -1774,25 +3091,167 @@ Plugin directories (searched in order):
 
 Each plugin is a .py file that defines a register(api) function.
 The api object provides:
-  - api.add_segment(name, renderer, defaults=None)
+  - api.add_segment(name, renderer, defaults=None, requires=None, timeout_ms=None)
       Register a custom segment renderer. renderer(ctx, opts) -> str
+      requires lists the data providers the segment reads (see DATA_PROVIDERS);
+      None runs all of them whenever the segment is shown. timeout_ms
+      overrides SL_PLUGIN_TIMEOUT_MS for this segment
   - api.RESET, api.BOLD — ANSI constants
   - api.fg(hex_or_256) — foreground color code
   - api.bg(hex_or_256) — background color code
   - api.text_color(key) — theme text color
+  - api.cached(key, ttl, fn), api.cache_get(key, max_age=None), api.cache_put(key, value)
+      Persistent JSON cache, one namespace per plugin file (see "Plugin cache")
+  - api.add_provider(name, fn, interval), api.latest(name, max_age=None)
+      Background data source: fn() runs out of band at most every interval
+      seconds and renderers read its last result (see "Plugin providers")
+  - api.usage_history(window, since=None, resets_at=None)
+      Recorded usage samples [(timestamp, utilization, resets_at)] (see USAGE HISTORY)
 
 Plugins are loaded once at import time. Segment names from plugins
 are automatically added to VALID_SEGMENTS so they can be used in
 SL_SEGMENTS configuration.
+
+A manifest (CACHE_DIR/.plugin_manifest.json) records which segment names
+each plugin file registered, keyed on its path, mtime and size. A file is
+only imported when it is new or changed, or registers a segment named in
+SL_SEGMENTS; the rest cost a stat() per render.
 """
 
+PLUGIN_MANIFEST_PATH = os.path.join(CACHE_DIR, ".plugin_manifest.json")
+_PLUGIN_REGISTERED = []  # segment names add_segment() saw, for the manifest
+
+# Plugin renderers run in their own threads with a deadline each. Their last
+# good output, consecutive timeouts and demotion time live in
+# CACHE_DIR/.plugin_state.json, keyed on segment name, options and cwd.
+PLUGIN_STATE_PATH = os.path.join(CACHE_DIR, ".plugin_state.json")
+PLUGIN_STATE_MAX_ENTRIES = 64
+PLUGIN_TIMEOUTS = {}  # segment name -> ms, from add_segment(timeout_ms=...)
+
+
+def _plugin_state_key(name, opts, cwd):
+    # Per directory: a project plugin's last output means nothing elsewhere
+    return json.dumps([name, opts, cwd], sort_keys=True)
+
+
+# --- Plugin cache ---
+# One JSON file per key under CACHE_DIR/.plugin_cache/<plugin>/, written
+# atomically; the mtime is the last use, and each plugin keeps at most
+# PLUGIN_CACHE_MAX_ENTRIES. cached() recomputes under an flock on the key,
+# so concurrent sessions make one call and the rest serve the stale value.
+
+PLUGIN_CACHE_DIR = os.path.join(CACHE_DIR, ".plugin_cache")
+PLUGIN_CACHE_MAX_ENTRIES = 64
+
+
+def _plugin_namespace(filepath):
+    """Cache namespace of a plugin file: its name plus a hash of its absolute path.
+
+    A project plugin and a global one with the same file name stay apart.
+    """
+    import zlib
+
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    return f"{name}-{zlib.crc32(os.path.abspath(filepath).encode()):08x}"
+
+
+def _plugin_cache_path(namespace, key):
+    import zlib
+
+    raw = key.encode()
+    return os.path.join(PLUGIN_CACHE_DIR, namespace, f"{zlib.crc32(raw):08x}{zlib.adler32(raw):08x}.json")
+
+
+def _plugin_cache_read(path, key):
+    """(value, age in seconds) stored for key, or None. Counts as a use for LRU."""
+    entry = _read_json(path)
+    if entry is None or entry.get("key") != key:
+        return None  # missing, or a hash collision
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry.get("value"), time.time() - entry.get("at", 0)
+
+
+def _plugin_cache_write(path, key, value):
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return
+    _write_json_atomic(path, {"key": key, "at": round(time.time(), 3), "value": value})
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith(".json")]
+        if len(entries) > PLUGIN_CACHE_MAX_ENTRIES:
+            entries.sort(key=lambda e: e.stat().st_mtime_ns)
+            for entry in entries[: len(entries) - PLUGIN_CACHE_MAX_ENTRIES]:
+                os.unlink(entry.path)
+                try:
+                    os.unlink(entry.path + ".lock")
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+# --- Plugin providers ---
+# api.add_provider() registers fn as a REFRESHERS entry named
+# "plugin:<plugin>.<name>", stored in the plugin's cache. Renders never call
+# fn: when the stored value is older than its interval they start the usual
+# detached `--refresh` process (which loads the same plugins), or a thread
+# when running as the daemon (the render's copy finishes it after replying),
+# under the same single-flight lock.
+
+PLUGIN_PROVIDERS = []  # REFRESHERS names registered by loaded plugins
+_IN_DAEMON = False  # set by serve_daemon(): refresh in a thread, not a process
+
+
+def _plugin_provider_due(interval):
+    def due(cache, now):
+        if not cache:
+            return True
+        return now - max(cache.get("at", 0), cache.get("failed_at", 0)) >= interval
+
+    return due
+
+
+def _plugin_provider_refresher(path, key, fn):
+    def refresh():
+        try:
+            value = fn()
+        except Exception:
+            _record_refresh_failure(path, _read_json(path) or {"key": key})
+            return
+        _plugin_cache_write(path, key, value)
+
+    return refresh
+
+
+def _poll_plugin_providers():
+    """Start a background refresh for each plugin provider whose value is due."""
+    now = time.time()
+    for name in PLUGIN_PROVIDERS:
+        cache_path, due, _refresh = REFRESHERS[name]
+        if not due(_read_json(cache_path), now):
+            continue
+        if not _IN_DAEMON:
+            _spawn_refresh(name)
+        elif not _refresh_in_flight(cache_path):
+            thread = threading.Thread(target=run_refresh, args=(name,), daemon=True)
+            thread.start()
+            _BACKGROUND.append(thread)
+
 
 class _PluginAPI:
-    """API object passed to plugin register() functions."""
+    """API object passed to plugin register() functions (one per plugin file)."""
 
     RESET = RESET
     BOLD = BOLD
 
+    def __init__(self, namespace="plugin"):
+        self.namespace = namespace  # cache directory of this plugin
+
     @staticmethod
     def fg(color):
         """Foreground color from hex string ('#RRGGBB') or 256-color int."""
@@ -1817,39 +3276,108 @@ class _PluginAPI:
         return text_color(key)
 
     @staticmethod
-    def add_segment(name, renderer, defaults=None):
+    def usage_history(window, since=None, resets_at=None):
+        """Recorded samples of a usage window: [(timestamp, utilization, resets_at)], oldest first."""
+        return usage_history(window, since, resets_at)
+
+    def cache_get(self, key, max_age=None):
+        """Cached value for key, or None if missing (or older than max_age seconds)."""
+        hit = _plugin_cache_read(_plugin_cache_path(self.namespace, str(key)), str(key))
+        if hit is None or (max_age is not None and hit[1] > max_age):
+            return None
+        return hit[0]
+
+    def cache_put(self, key, value):
+        """Store a JSON-serializable value for key."""
+        _plugin_cache_write(_plugin_cache_path(self.namespace, str(key)), str(key), value)
+
+    def cached(self, key, ttl, fn):
+        """Value for key, calling fn() to refresh it once it is older than ttl seconds.
+
+        Single-flight across sessions: while another process refreshes the key,
+        this one returns the stale value (or waits, if there is none). If fn()
+        raises, the stale value is returned when there is one.
+        """
+        key = str(key)
+        path = _plugin_cache_path(self.namespace, key)
+        hit = _plugin_cache_read(path, key)
+        if hit is not None and hit[1] <= ttl:
+            return hit[0]
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        except OSError:
+            pass
+        with _RefreshLock(path, wait=hit is None) as lock:
+            if not lock.acquired and hit is not None:
+                return hit[0]  # Someone else is refreshing; serve stale
+            fresh = _plugin_cache_read(path, key)
+            if fresh is not None and fresh[1] <= ttl:
+                return fresh[0]  # Refreshed while we waited
+            try:
+                value = fn()
+            except Exception:
+                if hit is not None:
+                    return hit[0]
+                raise
+            _plugin_cache_write(path, key, value)
+            return value
+
+    def add_provider(self, name, fn, interval):
+        """Register fn() as a background data source refreshed every interval seconds.
+
+        fn runs in a detached refresher process (or a daemon thread), never on
+        the render path; its JSON-serializable result is read with latest(name).
+        """
+        key = f"provider:{name}"
+        path = _plugin_cache_path(self.namespace, key)
+        refresher = f"plugin:{self.namespace}.{name}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)  # for the value and its lock
+        except OSError:
+            pass
+        REFRESHERS[refresher] = (path, _plugin_provider_due(interval), _plugin_provider_refresher(path, key, fn))
+        if refresher not in PLUGIN_PROVIDERS:
+            PLUGIN_PROVIDERS.append(refresher)
+
+    def latest(self, name, max_age=None):
+        """Last value produced by provider name, or None (none yet, or older than max_age seconds)."""
+        return self.cache_get(f"provider:{name}", max_age)
+
+    @staticmethod
+    def add_segment(name, renderer, defaults=None, requires=None, timeout_ms=None):
         """Register a custom segment renderer.
 
         Args:
             name: Segment name (used in SL_SEGMENTS)
             renderer: Function(ctx, opts) -> str
             defaults: Optional dict of default options for this segment
+            requires: Optional provider names whose ctx keys the renderer reads
+                ("update", "usage", "git_branch", "git_status", "effort").
+                None (the default) runs every provider when the segment is shown.
+            timeout_ms: Optional render deadline overriding SL_PLUGIN_TIMEOUT_MS
         """
+        _PLUGIN_REGISTERED.append(name)
+        if timeout_ms is not None:
+            PLUGIN_TIMEOUTS[name] = timeout_ms
         SEGMENT_RENDERERS[name] = renderer
         if defaults:
             SEGMENT_DEFAULTS[name] = defaults
+        SEGMENT_PROVIDERS[name] = tuple(DATA_PROVIDERS) if requires is None else tuple(requires)
 
 
 def _load_plugins():
     """Discover and load plugins from project and global directories."""
     global VALID_SEGMENTS, SEGMENTS
-    plugin_dirs = []
-
-    # Project-level plugins (cwd-relative)
-    project_dir = os.path.join(".claude", "statusline")
-    if os.path.isdir(project_dir):
-        plugin_dirs.append(project_dir)
-
-    # Global plugins
-    global_dir = os.path.expanduser("~/.claude/statusline")
-    if os.path.isdir(global_dir):
-        plugin_dirs.append(global_dir)
-
+    plugin_dirs = [d for d in PLUGIN_DIRS if os.path.isdir(d)]
     if not plugin_dirs:
         return
 
-    api = _PluginAPI()
     registered_before = set(SEGMENT_RENDERERS.keys())
+    # Raw names: plugin segments are not in VALID_SEGMENTS until loaded
+    raw = os.environ.get("SL_SEGMENTS")
+    wanted = {token.split(":")[0] for token in (DEFAULT_SEGMENTS if raw is None else raw).split()}
+    manifest = _read_json(PLUGIN_MANIFEST_PATH) or {}
+    changed = False
 
     for plugin_dir in plugin_dirs:
         try:
@@ -1857,6 +3385,19 @@ def _load_plugins():
                 if not filename.endswith(".py") or filename.startswith("_"):
                     continue
                 filepath = os.path.join(plugin_dir, filename)
+                try:
+                    st = os.stat(filepath)
+                except OSError:
+                    continue
+                key = os.path.abspath(filepath)
+                stamp = [st.st_mtime_ns, st.st_size]
+                entry = manifest.get(key)
+                segments = entry.get("segments") if entry else None
+                # A file registering no segments (providers only) is always imported
+                if entry and entry.get("stamp") == stamp and segments and not wanted.intersection(segments):
+                    continue  # Unchanged, and none of its segments are shown
+                plugin_start = time.perf_counter()
+                del _PLUGIN_REGISTERED[:]
                 try:
                     # Load plugin module
                     import importlib.util
@@ -1865,12 +3406,23 @@ def _load_plugins():
                     module = importlib.util.module_from_spec(spec)
                     spec.loader.exec_module(module)
                     if hasattr(module, "register"):
-                        module.register(api)
+                        module.register(_PluginAPI(_plugin_namespace(filepath)))
                 except Exception:
-                    pass  # Silent failure — broken plugin shouldn't break statusline
+                    manifest.pop(key, None)  # Silent failure; retried next render
+                else:
+                    new_entry = {"stamp": stamp, "segments": sorted(set(_PLUGIN_REGISTERED))}
+                    if entry != new_entry:
+                        manifest[key] = new_entry
+                        changed = True
+                _PROFILE_LOAD["plugins_ms"][filepath] = _ms_since(plugin_start)
         except OSError:
             pass
 
+    if changed:
+        for key in [k for k in manifest if not os.path.exists(k)]:
+            del manifest[key]
+        _write_json_atomic(PLUGIN_MANIFEST_PATH, manifest)
+
     # Update VALID_SEGMENTS with any newly registered segment names
     new_segments = set(SEGMENT_RENDERERS.keys()) - registered_before
     if new_segments:
@@ -1879,6 +3431,96 @@ def _load_plugins():
         SEGMENTS = _parse_segments(os.environ.get("SL_SEGMENTS"))
 
 
+def _run_plugin_segments(ctx, jobs, timings=None, deadline=None):
+    """Render plugin segments concurrently; returns {index: text}.
+
+    jobs is [(SEGMENTS index, name, opts, renderer)]. Each renderer gets a
+    daemon thread and its own deadline (timeout_ms, else SL_PLUGIN_TIMEOUT_MS),
+    cut short by the render deadline when that comes first. A late or demoted
+    segment shows its last good output; a renderer that raises shows nothing.
+    PLUGIN_DEMOTE_AFTER timeouts of its own in a row demote a segment: it is
+    not run again for PLUGIN_RETRY seconds.
+    """
+    _poll_plugin_providers()
+    state = _read_json(PLUGIN_STATE_PATH) or {}
+    outcomes = {}  # state key -> rendered text, or None for a timeout
+    results = {}
+    now = time.time()
+    cwd = ctx.get("cwd", "")
+
+    def run(index, name, renderer, opts):
+        start = time.perf_counter()
+        try:
+            results[index] = renderer(ctx, opts) or ""
+        except Exception:
+            results[index] = ""  # A broken plugin shouldn't break the status line
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0) + _ms_since(start), 3)
+
+    threads = {}
+    for index, name, opts, renderer in jobs:
+        entry = state.get(_plugin_state_key(name, opts, cwd), {})
+        if now - entry.get("demoted_at", 0) < PLUGIN_RETRY:
+            continue
+        thread = threading.Thread(target=run, args=(index, name, renderer, opts), daemon=True)
+        thread.start()
+        threads[index] = thread
+
+    started = time.monotonic()
+    rendered = {}
+    for index, name, opts, _renderer in jobs:
+        key = _plugin_state_key(name, opts, cwd)
+        entry = state.get(key, {})
+        thread = threads.get(index)
+        if thread is not None:
+            own_deadline = started + PLUGIN_TIMEOUTS.get(name, PLUGIN_TIMEOUT_MS) / 1000
+            end = own_deadline if deadline is None else min(own_deadline, deadline)
+            thread.join(max(0, end - time.monotonic()))
+            if not thread.is_alive():
+                rendered[index] = outcomes[key] = results.get(index, "")
+            elif time.monotonic() < own_deadline:
+                # Out of render budget, not slow on its own: no strike against it
+                if BUDGET_MS > 0:
+                    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+                    _log_degradation(f"segment:{name}", entry.get("last"), elapsed_ms)
+            else:
+                outcomes[key] = None
+                _PROFILE_RENDER.setdefault("plugin_timeouts", []).append(name)
+        rendered.setdefault(index, entry.get("last", ""))
+    if any(_plugin_state_entry(state.get(key, {}), outcome, now) != state.get(key, {}) for key, outcome in outcomes.items()):
+        _save_plugin_outcomes(outcomes, now)
+    return rendered
+
+
+def _plugin_state_entry(entry, outcome, now):
+    """entry after one run: outcome is the rendered text, or None for a timeout."""
+    if outcome is not None:
+        return {"last": outcome}
+    timeouts = entry.get("timeouts", 0) + 1
+    new_entry = {**entry, "timeouts": timeouts}
+    new_entry.pop("demoted_at", None)
+    if timeouts >= PLUGIN_DEMOTE_AFTER:
+        new_entry["demoted_at"] = round(now, 3)
+    return new_entry
+
+
+def _save_plugin_outcomes(outcomes, now):
+    """Apply outcomes to .plugin_state.json as read under its lock.
+
+    Re-reading under the lock keeps concurrent sessions from overwriting each
+    other's timeout strikes and demotions.
+    """
+    with _RefreshLock(PLUGIN_STATE_PATH, wait=True):
+        state = _read_json(PLUGIN_STATE_PATH) or {}
+        for key, outcome in outcomes.items():
+            entry = state.pop(key, {})
+            state[key] = _plugin_state_entry(entry, outcome, now)
+        while len(state) > PLUGIN_STATE_MAX_ENTRIES:
+            state.pop(next(iter(state)))
+        _write_json_atomic(PLUGIN_STATE_PATH, state)
+
+
+_BUILTIN_RENDERERS = dict(SEGMENT_RENDERERS)  # before plugins add or override any
 _load_plugins()
 
 
@@ -1904,23 +3546,227 @@ def _join_parts(parts):
     return output
 
 
-def build_progress_bar(
-    pct,
-    model,
-    cwd,
-    total_tokens,
-    context_limit,
-    usage_5hour="",
-    usage_weekly="",
-    usage_fable="",
-    usage_weekly_burndown="",
-    usage_weekly_burndown_color="",
-    update_info=None,
-    added_dirs=None,
-    worktree=None,
-    data=None,
-):
-    """Build the full status line string"""
+# --- Width-aware layout (SL_WIDTH / COLUMNS) ---
+# Segments are measured after rendering; a line that is too wide has its
+# lowest-priority segments shortened (SEGMENT_COMPACT), then dropped, until it
+# fits. Segments backed by I/O providers whose removal is certain before any
+# data is fetched are neither gathered nor rendered.
+
+_ESCAPE_RE = re.compile(r"\033\[[0-9;?]*[A-Za-z]")
+
+
+def layout_width():
+    """Columns each line must fit in: SL_WIDTH, else $COLUMNS, else 0 (no limit)."""
+    if WIDTH > 0:
+        return WIDTH
+    try:
+        return max(0, int(os.environ.get("COLUMNS", "0")))
+    except ValueError:
+        return 0
+
+
+@functools.lru_cache(maxsize=1024)
+def _char_width(char):
+    """Terminal cells for one character (East Asian wide = 2, combining/format = 0)."""
+    import unicodedata
+
+    if unicodedata.combining(char) or unicodedata.category(char) in ("Mn", "Me", "Cf"):
+        return 0
+    return 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+
+
+def display_width(text):
+    """Width of text on screen, ignoring escape sequences."""
+    text = _ESCAPE_RE.sub("", text)
+    if text.isascii():
+        return len(text)
+    return sum(_char_width(char) for char in text)
+
+
+def _segment_priority(name, opts):
+    try:
+        return int(opts.get("priority", SEGMENT_PRIORITY.get(name, 50)))
+    except ValueError:
+        return SEGMENT_PRIORITY.get(name, 50)
+
+
+def _line_width(items):
+    return display_width(_join_parts([text for _name, _opts, text in items]))
+
+
+def _fit_line(items, ctx, width):
+    """Shorten, then drop, the lowest-priority segments of one line until it fits."""
+    if _line_width(items) <= width:
+        return items
+    # Lowest priority first; among equals, the rightmost goes first
+    order = sorted(range(len(items)), key=lambda i: (_segment_priority(items[i][0], items[i][1]), -i))
+    for i in order:
+        name, opts, text = items[i]
+        compact = SEGMENT_COMPACT.get(name)
+        renderer = SEGMENT_RENDERERS.get(name)
+        if compact and renderer is _BUILTIN_RENDERERS.get(name):
+            shorter = renderer(ctx, {**opts, **compact})
+            if display_width(shorter) < display_width(text):
+                items[i] = (name, opts, shorter)
+                if _line_width(items) <= width:
+                    return items
+    for i in order[:-1]:  # the top segment stays, even if it alone overflows
+        items[i] = (items[i][0], items[i][1], "")
+        if _line_width(items) <= width:
+            break
+    return [item for item in items if item[2]]
+
+
+def _fit_width(rendered, ctx, width):
+    """Fit each line of rendered [(name, opts, text)] into width columns."""
+    fitted = []
+    line = []
+    for item in [*rendered, None]:
+        if item is None or item[2] == "\n":
+            fitted.extend(_fit_line(line, ctx, width))
+            if item is not None:
+                fitted.append(item)
+            line = []
+        else:
+            line.append(item)
+    return fitted
+
+
+def _segments_beyond_width(ctx, width):
+    """SEGMENTS indices of I/O-backed segments that _fit_line would drop whatever they show.
+
+    Payload-only segments are rendered now at their narrowest; I/O-backed ones
+    count as zero width. If the segments that outrank one still overflow the
+    line at those lower bounds, that one is dropped in every outcome.
+    """
+    skip = set()
+    lines = [[]]
+    for index, (name, opts) in enumerate(SEGMENTS):
+        if name == "new_line":
+            lines.append([])
+            continue
+        renderer = SEGMENT_RENDERERS.get(name)
+        if not renderer:
+            continue
+        expensive = renderer is not _BUILTIN_RENDERERS.get(name) or any(
+            p not in INLINE_PROVIDERS for p in SEGMENT_PROVIDERS.get(name, ())
+        )
+        narrowest = (0, 0)  # (width, leading spaces)
+        if not expensive:
+            text = renderer(ctx, opts)
+            compact = SEGMENT_COMPACT.get(name)
+            if compact and renderer is _BUILTIN_RENDERERS.get(name):
+                text = min(text, renderer(ctx, {**opts, **compact}), key=display_width)
+            narrowest = (display_width(text), len(text) - len(text.lstrip()))
+        rank = (_segment_priority(name, opts), -index)
+        lines[-1].append((index, expensive, rank, narrowest))
+    for line in lines:
+        for index, expensive, rank, _narrowest in line:
+            if not expensive:
+                continue
+            outranking = [n for _i, _e, r, n in line if r > rank]
+            # Only the first segment on a line loses its leading spaces
+            lower_bound = sum(w for w, _lead in outranking) - max((lead for _w, lead in outranking), default=0)
+            if lower_bound > width:
+                skip.add(index)
+    return skip
+
+
+class _LazyContext(dict):
+    """Renderer ctx whose derived values are computed on first read, once per render.
+
+    provide(keys, factory) registers factory(ctx) -> {key: value, ...} for
+    keys. The first read of any of them runs it, under a lock per factory so
+    the built-ins and concurrent plugin threads share one computation, and
+    keeps everything it returned. A factory that raises yields no keys.
+    It is a dict, as ctx always was: copy(), iteration, len() and json.dumps()
+    see every key, computing any still pending first. The built-in segments
+    only look keys up, so they never pay for keys they do not read.
+    """
+
+    def __init__(self, values=None):
+        super().__init__(values or {})
+        self._factories = {}  # key -> (factory, lock)
+
+    def provide(self, keys, factory):
+        entry = (factory, threading.Lock())
+        for key in keys:
+            self._factories[key] = entry
+
+    def settle(self, keys, values):
+        """Store values and stop computing keys: their producer already ran (gather_data)."""
+        for key in keys:
+            self._factories.pop(key, None)
+        super().update(values)
+
+    def __missing__(self, key):
+        entry = self._factories.get(key)
+        if entry is None:
+            raise KeyError(key)
+        factory, lock = entry
+        with lock:
+            if self._factories.get(key) is entry:
+                try:
+                    produced = factory(self)
+                except Exception:
+                    produced = {}  # A failing source must not break the status line
+                for produced_key, value in produced.items():
+                    super().setdefault(produced_key, value)
+                for produced_key, other in list(self._factories.items()):
+                    if other is entry:
+                        del self._factories[produced_key]
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def _resolve(self):
+        """Compute every pending key."""
+        for key in list(self._factories):
+            try:
+                self[key]
+            except KeyError:
+                pass
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._factories
+
+    def __setitem__(self, key, value):
+        self._factories.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __iter__(self):
+        self._resolve()
+        return iter(list(dict.keys(self)))
+
+    def __len__(self):
+        self._resolve()
+        return super().__len__()
+
+    def keys(self):
+        self._resolve()
+        return super().keys()
+
+    def values(self):
+        self._resolve()
+        return super().values()
+
+    def items(self):
+        self._resolve()
+        return super().items()
+
+    def copy(self):
+        self._resolve()
+        return dict(super().items())
+
+
+def _bar_ctx(pct):
+    """Progress bar geometry and colors at pct."""
     bar_width = max(1, min(128, int(_segment_opts("progress_bar").get("width", "12"))))
     exact_fill = pct * bar_width / 100
     filled = int(exact_fill)
@@ -1928,18 +3774,8 @@ def build_progress_bar(
 
     BLOCKS = " ▏▎▍▌▋▊▉█"  # index 0=empty, 8=full
 
-    bar_rgb, bar_256 = get_colors_for_percentage(pct)
-    model_color = get_model_colors(model)
-
-    # Token display (may be None if only API percentage available)
-    numbers_color = text_color("numbers")
-    if total_tokens is not None:
-        token_display = f"{numbers_color}\u00a0({total_tokens // 1000}k/{context_limit // 1000}k)"
-    else:
-        token_display = f"{numbers_color}\u00a0(--/{context_limit // 1000}k)"
-
     # Build bar with sub-character precision
-    fill_fg = fg_gradient(bar_rgb, bar_256)
+    fill_fg = fill_color(pct)
     empty_fg_str = fg_empty()
     block_index = round(fraction * 8)
 
@@ -1949,43 +3785,106 @@ def build_progress_bar(
     elif block_index == 0 or filled >= bar_width:
         transition = ""
     else:
-        theme = THEMES[THEME]
-        empty_rgb, empty_fb = theme["bar_empty"]
-        bg_empty = _color(empty_rgb, empty_fb, is_bg=True)
-        transition = bg_empty + fill_fg + BLOCKS[block_index]
+        transition = _bg("bar_empty") + fill_fg + BLOCKS[block_index]
 
     empty = bar_width - filled - (1 if transition else 0)
+    return {"fill_fg": fill_fg, "filled": filled, "transition": transition, "empty_fg_str": empty_fg_str, "empty": empty}
 
-    ctx = {
-        "model": model,
-        "model_color": model_color,
-        "fill_fg": fill_fg,
-        "filled": filled,
-        "transition": transition,
-        "empty_fg_str": empty_fg_str,
-        "empty": empty,
-        "pct": pct,
-        "token_display": token_display,
-        "cwd": cwd,
-        "usage_5hour": usage_5hour,
-        "usage_weekly": usage_weekly,
-        "usage_fable": usage_fable,
-        "usage_weekly_burndown": usage_weekly_burndown,
-        "usage_weekly_burndown_color": usage_weekly_burndown_color,
-        "update_info": update_info,
-        "added_dirs": added_dirs or [],
-        "worktree": worktree,
-        "effort_level": get_effort_level(data),
-        "data": data or {},
-    }
 
-    parts = []
-    for name, opts in SEGMENTS:
+def _token_display(total_tokens, context_limit):
+    # Token display (may be None if only API percentage available)
+    numbers_color = text_color("numbers")
+    if total_tokens is not None:
+        return f"{numbers_color}\u00a0({total_tokens // 1000}k/{context_limit // 1000}k)"
+    return f"{numbers_color}\u00a0(--/{context_limit // 1000}k)"
+
+
+def _git_root_ctx(ctx):
+    cwd = ctx["cwd"]
+    meta = _read_git_metadata(cwd) if cwd else None
+    if meta is not None:
+        return {"git_root": meta["root"]}
+    dirs = _find_git_dirs(cwd) if cwd else None
+    return {"git_root": dirs[0] if dirs else None}
+
+
+def _base_ctx(pct, model, cwd, total_tokens, context_limit, added_dirs=None, worktree=None, data=None):
+    """Renderer ctx for one payload.
+
+    Only the payload fields are filled in. Bar geometry, colors, token text,
+    git root and every data provider's keys (PROVIDER_KEYS) are computed when
+    a segment first reads them.
+    """
+    ctx = _LazyContext(
+        {
+            "model": model,
+            "pct": pct,
+            "cwd": cwd,
+            "added_dirs": added_dirs or [],
+            "worktree": worktree,
+            "data": data or {},
+        }
+    )
+    ctx.provide(("model_color",), lambda c: {"model_color": get_model_colors(model)})
+    ctx.provide(("fill_fg", "filled", "transition", "empty_fg_str", "empty"), lambda c: _bar_ctx(pct))
+    ctx.provide(("token_display",), lambda c: {"token_display": _token_display(total_tokens, context_limit)})
+    ctx.provide(("git_root",), _git_root_ctx)
+    for name, keys in PROVIDER_KEYS.items():
+        ctx.provide(keys, lambda c, name=name: DATA_PROVIDERS[name](c["data"]))
+    return ctx
+
+
+def build_progress_bar(
+    pct,
+    model,
+    cwd,
+    total_tokens,
+    context_limit,
+    added_dirs=None,
+    worktree=None,
+    data=None,
+    provided=None,
+    skip=(),
+    deadline=None,
+):
+    """Build the full status line string.
+
+    skip holds SEGMENTS indices that are not rendered (the layout drops them).
+    deadline (monotonic) caps how long plugin segments are waited for.
+    """
+    ctx = _base_ctx(pct, model, cwd, total_tokens, context_limit, added_dirs, worktree, data)
+    if provided is not None:
+        # Output of the providers gather_data() ran (usage_*, update_info, git_*,
+        # effort_level); a provider it gave up on stays absent, never recomputed
+        gathered = _active_providers(skip)
+        ctx.settle([key for name in gathered for key in PROVIDER_KEYS.get(name, ())], provided)
+
+    rendered = []
+    timings = _PROFILE_RENDER.setdefault("segments_ms", {}) if _PROFILE_ENABLED else None
+    plugin_jobs = []
+    for index, (name, opts) in enumerate(SEGMENTS):
+        renderer = SEGMENT_RENDERERS.get(name)
+        if renderer and index not in skip and renderer is not _BUILTIN_RENDERERS.get(name):
+            plugin_jobs.append((index, name, opts, renderer))
+    # Plugins render concurrently, each against its own deadline
+    plugin_output = _run_plugin_segments(ctx, plugin_jobs, timings, deadline) if plugin_jobs else {}
+    for index, (name, opts) in enumerate(SEGMENTS):
         renderer = SEGMENT_RENDERERS.get(name)
-        if renderer:
+        if index in plugin_output:
+            result = plugin_output[index]
+        elif renderer and index not in skip:
+            start = time.perf_counter()
             result = renderer(ctx, opts)
-            if result:
-                parts.append(result)
+            if timings is not None:
+                timings[name] = round(timings.get(name, 0) + _ms_since(start), 3)
+        else:
+            continue
+        if result:
+            rendered.append((name, opts, result))
+    width = layout_width()
+    if width:
+        rendered = _fit_width(rendered, ctx, width)
+    parts = [result for _name, _opts, result in rendered]
     parts.append(RESET)
 
     return _join_parts(parts)
@@ -2138,8 +4037,7 @@ def show_scale_demo(mode="animate"):
         exact_fill = pct * bar_width / 100
         filled = int(exact_fill)
         fraction = exact_fill - filled
-        bar_rgb, bar_256 = get_colors_for_percentage(pct)
-        fill_fg = fg_gradient(bar_rgb, bar_256)
+        fill_fg = fill_color(pct)
         empty_fg_str = fg_empty()
         block_index = round(fraction * 8)
 
@@ -2149,10 +4047,7 @@ def show_scale_demo(mode="animate"):
         elif block_index == 0 or filled >= bar_length:
             transition = ""
         else:
-            theme = THEMES[THEME]
-            empty_rgb, empty_fb = theme["bar_empty"]
-            bg_empty = _color(empty_rgb, empty_fb, is_bg=True)
-            transition = bg_empty + fill_fg + BLOCKS[block_index]
+            transition = _bg("bar_empty") + fill_fg + BLOCKS[block_index]
 
         empty = bar_length - filled - (1 if transition else 0)
         bar = fill_fg + "█" * filled + transition + RESET + empty_fg_str + "█" * empty + RESET
@@ -2383,52 +4278,680 @@ def show_usage_principle_demo():
 
 
 # =============================================================================
-# MAIN
+# REPLAY MODE
 # =============================================================================
 
 
-def main():
-    # Check theme is configured
-    if THEME not in THEMES:
-        # Yellow text on red bg, then red text on yellow bg
-        print(
-            "\033[48;5;196m\033[38;5;220m\033[1m PLEASE SET THEME to 'dark' or 'light' in claude-code-status-line.py \033[0m"
-        )
-        print(
-            "\033[48;5;220m\033[38;5;196m\033[1m PLEASE SET THEME to 'dark' or 'light' in claude-code-status-line.py \033[0m"
-        )
-        return
+def run_replay(args):
+    """--replay FILE|- [--json]: render every NDJSON payload in this process.
+
+    Plain output is one line per input line, blank ones included, with the
+    newlines of multi-line renders escaped as \\n. Invalid lines and payloads
+    that fail to render are left empty. --json writes one {"line", "output"}
+    object per input line instead ("error" for those). The theme, segment
+    parse and caches are set up once for the whole stream.
+    """
+    global DUMP, USAGE_HISTORY
+    as_json = "--json" in args
+    paths = [a for a in args if a != "--json"]
+    if len(paths) != 1:
+        print("usage: --replay FILE|- [--json]", file=sys.stderr)
+        return 2
+    DUMP = ""  # Never append to the capture being replayed
+    USAGE_HISTORY = False  # Old samples stamped with today's time would corrupt it
+    try:
+        for number, line in enumerate(_iter_payload_lines(paths[0]), 1):
+            payload = _parse_payload_line(line)
+            output = error = None
+            if payload is None:
+                error = "invalid JSON payload"
+            else:
+                try:
+                    output = render_status_line(payload)
+                except Exception as e:  # one malformed payload must not end the run
+                    error = f"render failed: {type(e).__name__}: {e}"
+            if as_json:
+                record = {"line": number, "output": output} if error is None else {"line": number, "error": error}
+                sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                sys.stdout.write((output or "").replace("\n", "\\n") + "\n")
+            sys.stdout.flush()
+    except OSError as e:
+        print(f"replay: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+"""
+--bench FILE replays SL_DUMP captures (or raw NDJSON payloads) and reports
+p50/p95/p99 render latency with per-provider and per-segment breakdowns.
+
+Scenarios:
+  inproc-cold   one process, in-memory and derived disk caches dropped before every render
+  inproc-warm   one process, caches primed by a first pass over the payloads
+  spawn-cold    a new process per payload, each with a fresh cache directory
+  spawn-warm    a new process per payload, sharing a primed cache directory
+
+Every run uses a private SL_CACHE_DIR seeded with the network caches (usage,
+update, statusline) and cache durations stretched so nothing is refreshed,
+under a throwaway HOME that links the real theme and plugins but not the
+credentials: the benchmark never touches the network or the real caches,
+even for scripts that predate SL_CACHE_DIR. The render cache is off, so
+warm runs time the render path rather than cache hits. --compare SCRIPT
+runs the same scenarios against another version of this script.
+"""
+
+BENCH_NETWORK_CACHES = (USAGE_CACHE_PATH, UPDATE_CACHE_PATH, STATUSLINE_CACHE_PATH)
+BENCH_DEFAULT_LIMIT = 100
+
+
+def _percentile(sorted_samples, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))]
+
+
+def _bench_seed_dir(path):
+    """Cache dir holding copies of the network caches, or records that make them look fresh-but-empty."""
+    os.makedirs(path, exist_ok=True)
+    now = time.time()
+    placeholders = {
+        USAGE_CACHE_PATH: {"timestamp": now, "data": None},
+        UPDATE_CACHE_PATH: {"timestamp": now, "version": None, "source": None, "version_cmd": UPDATE_VERSION_CMD},
+        STATUSLINE_CACHE_PATH: {"timestamp": now, "version": None},
+    }
+    for cache_path in BENCH_NETWORK_CACHES:
+        target = os.path.join(path, os.path.basename(cache_path))
+        try:
+            shutil.copyfile(cache_path, target)
+        except OSError:
+            _write_json_atomic(target, placeholders[cache_path])
+
+
+def _bench_home(cache_dir):
+    """Throwaway HOME next to cache_dir: the real theme and plugins, seeded caches, no credentials."""
+    home = cache_dir + "-home"
+    claude_dir = os.path.join(home, ".claude")
+    if not os.path.isdir(claude_dir):
+        _bench_seed_dir(claude_dir)  # where scripts without SL_CACHE_DIR keep their caches
+        for name in (os.path.basename(THEME_FILE), "statusline"):
+            real = os.path.join(os.path.expanduser("~/.claude"), name)
+            if os.path.exists(real):
+                os.symlink(real, os.path.join(claude_dir, name))
+    return home
+
+
+def _bench_env(cache_dir, profile_path=None):
+    env = dict(os.environ)
+    env["SL_CACHE_DIR"] = cache_dir
+    env["HOME"] = _bench_home(cache_dir)
+    env["SL_RENDER_CACHE"] = "0"  # warm runs would otherwise time cache hits only
+    for key in (
+        "SL_USAGE_CACHE_DURATION",
+        "SL_UPDATE_CACHE_DURATION",
+        "SL_UPDATE_RETRY_DURATION",
+        "SL_UPDATE_CUSTOM_RETRY_DURATION",
+        "SL_STATUSLINE_CACHE_DURATION",
+    ):
+        env[key] = str(10**9)
+    env.pop("SL_DUMP", None)
+    env.pop("SL_PROFILE", None)
+    if profile_path:
+        env["SL_PROFILE"] = profile_path
+    return env
+
+
+def _bench_record(record, samples):
+    """Append one render's timings (SL_PROFILE record shape) to samples[row]."""
+    for key, row in (("wall_ms", "wall"), ("startup_ms", "startup"), ("module_ms", "module"), ("render_ms", "render")):
+        if isinstance(record.get(key), (int, float)):
+            samples.setdefault(row, []).append(record[key])
+    for section, prefix in (("providers_ms", "provider "), ("segments_ms", "segment ")):
+        for name, ms in (record.get(section) or {}).items():
+            samples.setdefault(prefix + name, []).append(ms)
+
+
+def _bench_inproc(script, payload_file, limit, runs, cold, tmp):
+    """In-process scenario, run in a worker process so its caches stay private."""
+    cache_dir = os.path.join(tmp, f"inproc-{'cold' if cold else 'warm'}-{abs(hash(script))}")
+    _bench_seed_dir(cache_dir)
+    cmd = [sys.executable, script, "--bench-worker", payload_file, str(limit), str(runs), "cold" if cold else "warm"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, env=_bench_env(cache_dir), stdin=subprocess.DEVNULL)
+    except OSError:
+        return None
+    samples = {}
+    for line in result.stdout.splitlines():
+        try:
+            _bench_record(json.loads(line), samples)
+        except ValueError:
+            return None  # script predates --bench-worker
+    return samples or None
+
+
+def _bench_spawn(script, payloads, runs, cold, tmp):
+    """One process per payload; wall time plus the child's SL_PROFILE record."""
+    samples = {}
+    shared = os.path.join(tmp, f"spawn-warm-{abs(hash(script))}")
+    profile_path = os.path.join(tmp, "profile.jsonl")
+    if not cold:
+        _bench_seed_dir(shared)
+    passes = runs if cold else runs + 1  # warm: the first pass only primes the caches
+    for run in range(passes):
+        for i, payload in enumerate(payloads):
+            if cold:
+                cache_dir = os.path.join(tmp, f"spawn-cold-{abs(hash(script))}-{run}-{i}")
+                _bench_seed_dir(cache_dir)
+            else:
+                cache_dir = shared
+            try:
+                os.unlink(profile_path)
+            except OSError:
+                pass
+            raw = json.dumps(payload)
+            start = time.perf_counter()
+            try:
+                subprocess.run(
+                    [sys.executable, script],
+                    input=raw,
+                    capture_output=True,
+                    text=True,
+                    env=_bench_env(cache_dir, profile_path),
+                )
+            except OSError:
+                return None
+            wall = _ms_since(start)
+            if not cold and run == 0:
+                continue
+            record = {}
+            try:
+                with open(profile_path) as f:
+                    record = json.loads(f.readline() or "{}")
+            except (OSError, ValueError):
+                pass  # script predates SL_PROFILE: wall time only
+            record["wall_ms"] = wall
+            _bench_record(record, samples)
+    return samples
+
+
+def _bench_rows(samples):
+    order = {"wall": 0, "startup": 1, "module": 2, "render": 3}
+    return sorted(samples, key=lambda row: (order.get(row, 4), row))
+
+
+def _bench_stats(values):
+    values = sorted(values or [])
+    return [_percentile(values, q) for q in (0.5, 0.95, 0.99)]
+
+
+def _fmt_ms(value):
+    return f"{value:9.3f}" if value is not None else f"{'-':>9}"
+
+
+def bench_worker(payload_file, limit, runs, mode):
+    """--bench-worker: render payloads in this process, one JSON timing record per render."""
+    global _PROFILE_ENABLED
+    _PROFILE_ENABLED = True
+    payloads = list(_iter_payloads(payload_file))[:limit]
+    if mode == "warm":
+        for payload in payloads:
+            render_status_line(payload)
+    for _ in range(runs):
+        for payload in payloads:
+            if mode == "cold":
+                _reset_caches()
+            render_status_line(payload)
+            print(json.dumps(_PROFILE_RENDER))
+    return 0
+
+
+def run_bench(args):
+    """--bench FILE [--runs N] [--limit N] [--compare SCRIPT]"""
+    runs = 1
+    limit = BENCH_DEFAULT_LIMIT
+    other = None
+    payload_file = None
+    it = iter(args)
+    try:
+        for arg in it:
+            if arg == "--runs":
+                runs = max(1, int(next(it)))
+            elif arg == "--limit":
+                limit = max(1, int(next(it)))
+            elif arg == "--compare":
+                other = os.path.abspath(next(it))
+            elif payload_file is None:
+                payload_file = arg
+            else:
+                raise ValueError(arg)
+    except (StopIteration, ValueError):
+        payload_file = None
+    if not payload_file:
+        print("usage: --bench FILE [--runs N] [--limit N] [--compare SCRIPT]", file=sys.stderr)
+        return 2
+    try:
+        payloads = list(_iter_payloads(payload_file))[:limit]
+    except OSError as e:
+        print(f"bench: {e}", file=sys.stderr)
+        return 1
+    if not payloads:
+        print(f"bench: no payloads in {payload_file}", file=sys.stderr)
+        return 1
+
+    scripts = [get_script_path()] + ([other] if other else [])
+    print(f"bench: {len(payloads)} payloads x {runs} run(s) from {payload_file}")
+    for i, script in enumerate(scripts):
+        print(f"  {'ABCDEFGH'[i]}: {script}")
+
+    with tempfile.TemporaryDirectory(prefix="statusline-bench-") as tmp:
+        # The worker re-reads the payload file; hand it a private copy so "-" works
+        payload_copy = os.path.join(tmp, "payloads.jsonl")
+        with open(payload_copy, "w") as f:
+            f.writelines(json.dumps(p) + "\n" for p in payloads)
+        scenarios = [
+            ("inproc-cold", lambda script: _bench_inproc(script, payload_copy, limit, runs, True, tmp)),
+            ("inproc-warm", lambda script: _bench_inproc(script, payload_copy, limit, runs, False, tmp)),
+            ("spawn-cold", lambda script: _bench_spawn(script, payloads, runs, True, tmp)),
+            ("spawn-warm", lambda script: _bench_spawn(script, payloads, runs, False, tmp)),
+        ]
+        for name, run_scenario in scenarios:
+            results = [run_scenario(script) for script in scripts]
+            print()
+            header = "".join(f"{label:>9}" for label in ("p50", "p95", "p99"))
+            if other:
+                print(f"== {name} (ms)".ljust(34) + f"{'A':>14}{'':13}" + f"{'B':>14}{'':13}" + f"{'B/A p50':>10}")
+                print(" " * 34 + header + header)
+            else:
+                print(f"== {name} (ms)".ljust(34) + header)
+            rows = _bench_rows({row: None for result in results if result for row in result})
+            if not rows:
+                print("  (not supported by this script)")
+                continue
+            for row in rows:
+                line = f"  {row}"[:33].ljust(34)
+                stats = []
+                for result in results:
+                    values = result.get(row) if result else None
+                    stats.append(_bench_stats(values))
+                    line += "".join(_fmt_ms(v) for v in stats[-1])
+                if other:
+                    a, b = stats[0][0], stats[1][0]
+                    line += f"{b / a:9.2f}x" if a and b is not None else f"{'-':>10}"
+                print(line)
+    return 0
+
+
+# =============================================================================
+# DAEMON MODE
+# =============================================================================
 
-    # Handle command-line options
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--self-update":
-            sys.exit(perform_self_update())
-        if sys.argv[1] == "--version":
-            print(VERSION)
-            return
-        if sys.argv[1] == "--demo-scale":
-            show_scale_demo(sys.argv[2] if len(sys.argv) > 2 else "animate")
-            return
-        if sys.argv[1] == "--demo-usage":
-            show_usage_demo()
-            return
-        if sys.argv[1] == "--demo-gauge":
-            show_gauge_sweep_demo()
-            return
-        if sys.argv[1] == "--demo-principle":
-            show_usage_principle_demo()
-            return
 
-    # Read and parse JSON input
+def _daemon_reply(raw):
+    """Render one forwarded payload into the client's stdout NUL stderr reply."""
     try:
-        raw = sys.stdin.read()
         data = json.loads(raw)
     except (json.JSONDecodeError, ValueError):
-        print("statusline: invalid JSON input", file=sys.stderr)
-        return
+        return "\0statusline: invalid JSON input\n"
+    import contextlib
+    import io
+
+    # The daemon's own stderr is /dev/null; send SL_PROFILE=1 records and any
+    # other diagnostics back for the client to write to its stderr
+    err = io.StringIO()
+    with contextlib.redirect_stderr(err):
+        output = render_status_line(data)
+    return (output + "\n" if output else "") + "\0" + err.getvalue()
+
+
+def _serve_connection(conn):
+    """Read one payload from conn, render it and send the reply."""
+    conn.settimeout(DAEMON_CLIENT_TIMEOUT)
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    try:
+        reply = _daemon_reply(b"".join(chunks).decode())
+    except Exception:
+        return  # Client sees a closed socket and renders in-process
+    conn.sendall(reply.encode())
+
+
+def serve_daemon(path=None):
+    """Serve renders over the configuration's UNIX socket until idle.
+
+    The daemon itself only accepts: each request is rendered in a forked copy
+    that already has the imports, theme and plugins loaded, so concurrent
+    clients never queue behind a slow render, and threads a render abandons
+    (late providers, hung plugins) end with its copy. A lock file next to the
+    socket keeps concurrently spawned daemons from fighting over it. path
+    overrides the socket (the standalone client picks its own).
+    """
+    import fcntl
+    import signal
+    import socket
+
+    global _IN_DAEMON
+    _IN_DAEMON = True  # plugin providers refresh in threads of the render's copy
+
+    # Let SIGTERM unwind through the finally below so the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # finished copies are reaped by the kernel
+
+    path = path or _daemon_socket_path()
+    try:
+        lock_file = open(path + ".lock", "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return 0  # Another daemon owns this configuration
+
+    try:
+        os.unlink(path)  # Stale socket from a daemon that died
+    except OSError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    server.settimeout(max(1, DAEMON_IDLE))
+
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            try:
+                pid = os.fork()
+            except OSError:
+                conn.close()  # Client renders in-process
+                continue
+            if pid:
+                conn.close()
+                continue
+            # Render copy: never returns into the accept loop or its cleanup
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)  # subprocess needs exit codes
+                server.close()
+                lock_file.close()
+                with conn:
+                    _serve_connection(conn)
+                _join_background()
+            except BaseException:
+                pass
+            finally:
+                os._exit(0)
+    finally:
+        server.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        lock_file.close()
+    return 0
+
+
+# =============================================================================
+# RENDER CACHE
+# =============================================================================
+
+"""
+Identical renders are common: Claude Code re-invokes the status line with
+payloads that differ only in fields no segment shows. The render cache keys
+the finished output on exactly what the built-in segments consume (payload
+fields, git metadata fingerprint, config, cache file mtimes and the current
+minute) and keeps the most recent RENDER_CACHE_MAX_ENTRIES outputs as files
+in CACHE_DIR/.render_cache, least recently used evicted first. Layouts with
+plugin segments bypass it, since plugins may read anything, and so do layouts
+whose providers cost no more than the lookup itself (payload-only segments,
+at most the status line update check's cache read).
+"""
+
+RENDER_CACHE_DIR = os.path.join(CACHE_DIR, ".render_cache")
+RENDER_CACHE_MAX_ENTRIES = 64
+
+
+def _render_cache_key(data):
+    """Key material for this payload as a JSON string, or None to bypass the cache."""
+    if not RENDER_CACHE or "GIT_DIR" in os.environ:
+        return None
+    if any(SEGMENT_RENDERERS.get(name) is not _BUILTIN_RENDERERS.get(name) for name, _opts in SEGMENTS):
+        return None
+    if not set(_active_providers()) - INLINE_PROVIDERS - {"statusline_update"}:
+        return None  # Rendering is cheaper than a cache read and write
+    cwd = data.get("cwd", "")
+    context_window = data.get("context_window") or {}
+    bucket = 60  # usage gauges and reset labels move with the clock
+    git = None
+    if _has_segment("git_branch") or _has_segment("git_status"):
+        if _has_segment("git_status"):
+            if GIT_CACHE_TTL <= 0:
+                return None
+            # Working-tree edits do not touch .git; honour the git cache's TTL
+            bucket = min(bucket, GIT_CACHE_TTL)
+        meta = _read_git_metadata(cwd) if cwd else None
+        dirs = _find_git_dirs(cwd) if cwd and meta is None else None
+        if meta is not None:
+            git = _git_fingerprint((meta["root"], meta["git_dir"], meta["common_dir"]), meta["branch"], meta["upstream"])
+        elif dirs is not None:
+            git = _git_fingerprint(dirs)
+    caches = []
+    for path in (USAGE_CACHE_PATH, UPDATE_CACHE_PATH, STATUSLINE_CACHE_PATH, INSTALLED_VERSION_CACHE_PATH):
+        try:
+            caches.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            caches.append(None)
+    material = [
+        data.get("model"),
+        context_window.get("used_percentage"),
+        context_window.get("context_window_size"),
+        context_window.get("current_usage"),
+        cwd,
+        data.get("rate_limits"),
+        data.get("effort"),
+        data.get("worktree"),
+        (data.get("workspace") or {}).get("added_dirs"),
+        data.get("version"),
+        git,
+        caches,
+        _claude_binary_fingerprint() if _has_segment("update") and not data.get("version") else None,
+        int(time.time() // bucket),
+        _config_signature(),
+    ]
+    try:
+        return json.dumps(material, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+
+
+def _render_cache_path(key):
+    import zlib
+
+    raw = key.encode()
+    return os.path.join(RENDER_CACHE_DIR, f"{zlib.crc32(raw):08x}{zlib.adler32(raw):08x}")
+
+
+def _render_cache_get(key):
+    """Cached output for key, or None. The full key is stored and compared, so hash collisions miss."""
+    path = _render_cache_path(key)
+    try:
+        with open(path) as f:
+            stored_key = f.readline()[:-1]
+            if stored_key != key:
+                return None
+            output = f.read()
+        os.utime(path)  # LRU: mtime is the last use
+    except OSError:
+        return None
+    return output
+
+
+def _render_cache_put(key, output):
+    try:
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=RENDER_CACHE_DIR, prefix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(key + "\n" + output)
+        os.replace(tmp_path, _render_cache_path(key))
+        entries = [e for e in os.scandir(RENDER_CACHE_DIR) if not e.name.startswith(".")]
+        if len(entries) > RENDER_CACHE_MAX_ENTRIES:
+            entries.sort(key=lambda e: e.stat().st_mtime_ns)
+            for entry in entries[: len(entries) - RENDER_CACHE_MAX_ENTRIES]:
+                os.unlink(entry.path)
+    except OSError:
+        pass
+
+
+# =============================================================================
+# SGR MINIMIZER
+# =============================================================================
+
+"""
+Segments are rendered independently, so the joined line repeats itself: a
+RESET after every part, the same foreground set again by the next part,
+backgrounds overridden before any text is drawn. minimize_sgr() replays the
+color codes against a model of the terminal's (fg, bg, bold) state and only
+emits a code where the state at the next visible character actually changes.
+It only ever writes codes the input already uses (0, 1 and fg/bg colors); an
+output containing any other SGR code is returned unchanged.
+"""
+
+_SGR_RE = re.compile(r"\033\[([0-9;]*)m")
+_SGR_DEFAULT = (None, None, False)  # (fg, bg, bold)
+
+
+def _sgr_apply(state, params):
+    """State after one SGR sequence, or None if it uses a code we do not model."""
+    fg, bg, bold = state
+    codes = params.split(";")
+    i = 0
+    while i < len(codes):
+        code = codes[i]
+        if code in ("", "0"):
+            fg, bg, bold = _SGR_DEFAULT
+        elif code == "1":
+            bold = True
+        elif code == "22":
+            bold = False
+        elif code in ("39", "49"):
+            fg, bg = (None, bg) if code == "39" else (fg, None)
+        elif code in ("38", "48"):
+            mode = codes[i + 1] if i + 1 < len(codes) else ""
+            size = {"5": 3, "2": 5}.get(mode)
+            if size is None or i + size > len(codes) or not all(c.isdigit() for c in codes[i + 2 : i + size]):
+                return None
+            color = ";".join(codes[i : i + size])
+            fg, bg = (color, bg) if code == "38" else (fg, color)
+            i += size
+            continue
+        elif code.isdigit() and (30 <= int(code) <= 37 or 90 <= int(code) <= 97):
+            fg = code
+        elif code.isdigit() and (40 <= int(code) <= 47 or 100 <= int(code) <= 107):
+            bg = code
+        else:
+            return None
+        i += 1
+    return fg, bg, bold
+
+
+def _sgr_transition(actual, desired):
+    """Shortest SGR sequence taking the terminal from actual (None = unknown) to desired."""
+    fg, bg, bold = desired
+    codes = ["0"] + (["1"] if bold else []) + [c for c in (fg, bg) if c]
+    if actual is not None and (bold or not actual[2]) and (fg or not actual[0]) and (bg or not actual[1]):
+        # Nothing to switch off: set what changed on top of the current state
+        step = (["1"] if bold and not actual[2] else []) + [c for c, was in ((fg, actual[0]), (bg, actual[1])) if c != was]
+        if len(";".join(step)) <= len(";".join(codes)):
+            codes = step
+    return f"\033[{';'.join(codes)}m"
 
-    _dump_input(data)
 
+def minimize_sgr(text):
+    """Drop SGR codes that do not change how any character of text is drawn.
+
+    Each line ends in the same state as before, so consumers that draw the
+    lines separately see the same colors as a terminal that carries state over.
+    """
+    if "\033[" not in text:
+        return text
+    out = []
+    actual = desired = _SGR_DEFAULT
+    pos = 0
+    for match in [*_SGR_RE.finditer(text), None]:
+        chunk = text[pos : match.start() if match else len(text)]
+        for index, piece in enumerate(chunk.split("\n")):
+            if index:  # line break: settle the state, then forget it unless it is the default
+                if actual != desired:
+                    out.append(_sgr_transition(actual, desired))
+                actual = desired if desired == _SGR_DEFAULT else None
+                out.append("\n")
+            if piece:
+                if actual != desired:
+                    out.append(_sgr_transition(actual, desired))
+                    actual = desired
+                out.append(piece)
+        if match is None:
+            break
+        desired = _sgr_apply(desired, match.group(1))
+        if desired is None:
+            return text
+        pos = match.end()
+    if actual != desired:
+        out.append(_sgr_transition(actual, desired))
+    return "".join(out)
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+
+def render_status_line(data):
+    """Render the full status line for one parsed stdin payload.
+
+    Returns the text main() prints (possibly multi-line), or "" when the
+    payload carries nothing to show yet. Shared by main() and the daemon.
+    """
+    _PROFILE_RENDER.clear()
+    start = time.perf_counter()
+    output = _render_status_line(data, render_deadline())
+    if _PROFILE_ENABLED:
+        _PROFILE_RENDER["render_ms"] = _ms_since(start)
+        if PROFILE:
+            _emit_profile()
+    return output
+
+
+def _render_status_line(data, deadline):
+    _dump_input(data)
+    _GIT_PROBES.clear()
+    _STALE_SOURCES.clear()
+
+    cache_key = _render_cache_key(data)
+    if cache_key is not None:
+        output = _render_cache_get(cache_key)
+        _PROFILE_RENDER["render_cache"] = "miss" if output is None else "hit"
+        if output is not None:
+            return output
+        output = _render_status_line_uncached(data, deadline)
+        if not _PROFILE_RENDER.get("degraded"):  # never memoize a late render
+            _render_cache_put(cache_key, output)
+        return output
+    return _render_status_line_uncached(data, deadline)
+
+
+def _render_status_line_uncached(data, deadline):
     model = data.get("model", {}).get("display_name", "Claude")
     cwd = data.get("cwd", "")
     added_dirs = data.get("workspace", {}).get("added_dirs", [])
@@ -2453,72 +4976,109 @@ def main():
 
     # Use API percentage
     if used_percentage is None:
-        return
+        return ""
     pct = int(used_percentage)
 
-    # Get usage limits indicators (prefer stdin from CC 2.1.80+, fallback to OAuth API)
-    rate_limits = data.get("rate_limits")
-    oauth_data = None
-    oauth_tried = False
-    if rate_limits:
-        usage_data = _normalize_usage_data(rate_limits)
-    else:
-        oauth_data = fetch_usage_data()  # Deprecated: will be removed in a future version
-        oauth_tried = True
-        usage_data = oauth_data
-
-    # Per-model usage is absent from stdin rate_limits, so usage_fable has to go
-    # to the OAuth API even when stdin already supplied the 5h/7d windows. Only
-    # pay that cost when the segment is actually enabled (result is disk-cached).
-    # Track "tried" rather than "is None" so an offline fetch is not retried here.
-    fable_opts = _segment_opts("usage_fable")
-    fable_model = fable_opts.get("model", "Fable")
-    # only_current=1 restricts the gauge to sessions actually running that model;
-    # skip the fetch too, so an inactive model costs nothing.
-    fable_wanted = _has_segment("usage_fable") and (
-        fable_opts.get("only_current", "0") != "1" or _model_matches(model, fable_model)
-    )
-    if fable_wanted:
-        if not oauth_tried:
-            oauth_data = fetch_usage_data()
-        scoped = _extract_scoped_usage(oauth_data, fable_model)
-        if scoped:
-            usage_data = dict(usage_data or {})
-            usage_data["seven_day_fable"] = scoped
-
-    usage_parts = format_usage_indicators(usage_data)
+    # Only the providers the configured segments consume, minus any the
+    # layout is certain to drop for width
+    skip = set()
+    width = layout_width()
+    if width:
+        base = _base_ctx(pct, model, cwd, total_tokens, context_limit, added_dirs, worktree, data)
+        skip = _segments_beyond_width(base, width)
+    provided = gather_data(data, deadline, skip)
 
-    # Check for updates
-    update_info = check_for_update()
-
-    print(
+    lines = [
         build_progress_bar(
             pct,
             model,
             cwd,
             total_tokens,
             context_limit,
-            usage_5hour=usage_parts["usage_5hour"],
-            usage_weekly=usage_parts["usage_weekly"],
-            usage_fable=usage_parts.get("usage_fable", ""),
-            usage_weekly_burndown=usage_parts.get("weekly_burndown", ""),
-            usage_weekly_burndown_color=usage_parts.get("weekly_burndown_color", ""),
-            update_info=update_info,
             added_dirs=added_dirs,
             worktree=worktree,
             data=data,
+            provided=provided,
+            skip=skip,
+            deadline=deadline,
         )
-    )
+    ]
 
-    # Check for status line updates (separate line below)
-    if SHOW_STATUSLINE_UPDATE:
-        statusline_update = check_for_statusline_update()
-        if statusline_update:
-            theme = THEMES[THEME]
-            yellow_rgb, yellow_fb = theme["usage_yellow"]
-            color = _color(yellow_rgb, yellow_fb, is_bg=False)
-            script_path = get_script_path()
-            print(f"{color}↳ Status line v{statusline_update} available. Update: {script_path} --self-update{RESET}")
+    # Status line update notice (separate line below)
+    statusline_update = provided.get("statusline_update")
+    if statusline_update:
+        color = _fg("usage_yellow")
+        script_path = get_script_path()
+        lines.append(f"{color}↳ Status line v{statusline_update} available. Update: {script_path} --self-update{RESET}")
+
+    output = "\n".join(lines)
+    return minimize_sgr(output) if MINIFY_ANSI else output
+
+
+def main():
+    if PROFILE:
+        _PROFILE_LOAD["startup_ms"] = _process_age_ms()  # process start -> main()
+        _PROFILE_LOAD["module_ms"] = _ms_since(_MODULE_START)  # imports, theme, plugins
+
+    # Check theme is configured (PALETTE is None when SL_THEME names no theme)
+    if PALETTE is None:
+        # Yellow text on red bg, then red text on yellow bg
+        print(
+            "\033[48;5;196m\033[38;5;220m\033[1m PLEASE SET THEME to 'dark' or 'light' in claude-code-status-line.py \033[0m"
+        )
+        print(
+            "\033[48;5;220m\033[38;5;196m\033[1m PLEASE SET THEME to 'dark' or 'light' in claude-code-status-line.py \033[0m"
+        )
+        return
+
+    # Handle command-line options
+    if len(sys.argv) > 1:
+        if sys.argv[1] == "--self-update":
+            sys.exit(perform_self_update())
+        if sys.argv[1] == "--version":
+            print(VERSION)
+            return
+        if sys.argv[1] == "--demo-scale":
+            show_scale_demo(sys.argv[2] if len(sys.argv) > 2 else "animate")
+            return
+        if sys.argv[1] == "--demo-usage":
+            show_usage_demo()
+            return
+        if sys.argv[1] == "--demo-gauge":
+            show_gauge_sweep_demo()
+            return
+        if sys.argv[1] == "--demo-principle":
+            show_usage_principle_demo()
+            return
+        if sys.argv[1] == "--serve":
+            sys.exit(serve_daemon(sys.argv[2] if len(sys.argv) > 2 else None))
+        if sys.argv[1] == "--replay":
+            sys.exit(run_replay(sys.argv[2:]))
+        if sys.argv[1] == "--bench":
+            sys.exit(run_bench(sys.argv[2:]))
+        if sys.argv[1] == "--bench-worker" and len(sys.argv) == 6:
+            sys.exit(bench_worker(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), sys.argv[5]))
+        if sys.argv[1] == "--refresh":
+            run_refresh(sys.argv[2] if len(sys.argv) > 2 else "")
+            return
+        # --client only reaches this point when the daemon did not answer
+
+    # Read and parse JSON input (the --client shim may have consumed stdin already)
+    try:
+        raw = _STDIN_RAW if _STDIN_RAW is not None else sys.stdin.read()
+        data = json.loads(raw)
+    except (json.JSONDecodeError, ValueError):
+        print("statusline: invalid JSON input", file=sys.stderr)
+        return
+
+    output = render_status_line(data)
+    if output:
+        print(output)
+    if _BACKGROUND:
+        # Hand the line over now (EOF on stdout); what is left only updates caches
+        sys.stdout.flush()
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        _join_background()
 
 
 if __name__ == "__main__":